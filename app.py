@@ -3,144 +3,90 @@ SmartDesk Support Platform — Flask Backend
 Full-stack AI-driven IT support ticket automation system
 """
 
-import os, re, json, joblib
-from datetime import datetime, date
+import os, json, time, base64
+from datetime import datetime, date, timedelta, timezone
 from functools import wraps
 
-from flask import (Flask, render_template, request, jsonify, session,
-                   redirect, url_for)
+from flask import (Flask, Response, render_template, request, jsonify,
+                   session, redirect, url_for, g, send_file)
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
 
+from batching import MicroBatcher
+from cache import PredictionCache
+from database import (get_db, init_db, init_app, PRIORITY_RANK,
+                      COUNTER_ALL_USERS)
+from entities import EntityMatcher
+from export_tickets import EXPORT_FORMATS, export_stream, parse_range
+from inference_server import InferenceClient
+from jobs import ClassificationWorker, CLASSIFYING_STATUS, enqueue
+import metrics
+from metrics import stage
+from model_registry import ModelRegistry, LEGACY_VERSION
+from online_learning import CORRECTABLE, CorrectionPublisher
+from preprocessing import preprocess_batch
+import profiling
+
 # ─────────────────────────────────────────────
 # App Setup
 # ─────────────────────────────────────────────
 app = Flask(__name__)
 app.secret_key = 'nexus-it-secret-2024-xk9'
-DB_PATH = 'nexus.db'
+init_app(app)
 
 # ─────────────────────────────────────────────
 # Load ML Models
 # ─────────────────────────────────────────────
-category_model = None
-priority_model  = None
-queue_model     = None
-model_stats     = {}
+# Cache of model outputs keyed on cleaned text + model version.
+# Set PREDICTION_CACHE_DB to share entries between workers on one host.
+prediction_cache = PredictionCache(
+    maxsize=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+    ttl=int(os.environ.get('PREDICTION_CACHE_TTL', 3600)),
+    db_path=os.environ.get('PREDICTION_CACHE_DB'),
+)
+
+# With INFERENCE_SOCKET set, models run in inference_server.py worker
+# processes and this process only holds proxies to them.
+inference_client = InferenceClient(os.environ['INFERENCE_SOCKET']) \
+    if os.environ.get('INFERENCE_SOCKET') else None
+
+# Handlers read registry.current once per request; reloads swap it atomically
+registry = ModelRegistry(
+    'models', on_swap=lambda bundle: prediction_cache.set_version(bundle.version),
+    loader=inference_client.remote_model if inference_client else None)
 
 def load_models():
-    global category_model, priority_model, queue_model, model_stats
     try:
-        category_model = joblib.load('models/category_model.pkl')
-        priority_model  = joblib.load('models/priority_model.pkl')
-        queue_model     = joblib.load('models/queue_model.pkl')
-        with open('models/stats.json') as f:
-            model_stats = json.load(f)
-        print("✅ Models loaded")
+        bundle = registry.activate()
+        print(f"✅ Models loaded (version {bundle.version})")
     except Exception as e:
         print(f"⚠️  Models not loaded: {e}")
 
 load_models()
 
+@app.before_request
+def refresh_models():
+    registry.maybe_refresh()
+
 # ─────────────────────────────────────────────
 # Text Preprocessing
 # ─────────────────────────────────────────────
-STOP_WORDS = {
-    'the','a','an','and','or','but','in','on','at','to','for','of','with',
-    'is','are','was','were','be','been','being','have','has','had','do',
-    'does','did','will','would','could','should','may','might','shall',
-    'this','that','these','those','i','we','you','he','she','they','it',
-    'my','our','your','his','her','their','its','me','us','him','her',
-    'dear','customer','support','team','hello','hi','hope','message',
-    'reaching','out','please','thank','thanks','regards','sincerely',
-}
+# Entity vocabularies and urgency keywords live in a dictionary file so they
+# can grow without touching code; ENTITY_DICTIONARY points at a custom one.
+entity_matcher = EntityMatcher.from_file(os.environ.get('ENTITY_DICTIONARY'))
+HIGH_URGENCY_KEYWORDS = entity_matcher.urgency
 
-HIGH_URGENCY_KEYWORDS = [
-    'not working','cannot access','system down','outage','urgent','asap',
-    'critical','emergency','immediately','broken','crashed','failure',
-    'security breach','data loss','ransomware','cyberattack','hack',
-    'cannot login','locked out','server down','network down','production down',
-]
-
-def preprocess(text):
-    if not isinstance(text, str): return ""
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    tokens = [w for w in text.split() if w not in STOP_WORDS and len(w) > 2]
-    return ' '.join(tokens)
+def scan_ticket(subject, body):
+    """Return (entities, urgency_keyword) from one pass over the ticket text."""
+    return entity_matcher.scan(f"{subject} {body}".lower())
 
 def extract_entities(subject, body):
     """Rule-based NER for IT entities."""
-    text = f"{subject} {body}".lower()
-    entities = {}
-
-    # Devices
-    devices = re.findall(
-        r'\b(laptop|desktop|printer|router|switch|server|monitor|keyboard|'
-        r'mouse|projector|tablet|phone|iphone|android|macbook|workstation|'
-        r'scanner|firewall|access point|wifi|vlan|nas|storage)\b', text)
-    if devices: entities['devices'] = list(set(devices))
-
-    # Software
-    software = re.findall(
-        r'\b(windows|linux|macos|ubuntu|outlook|excel|word|office|'
-        r'teams|slack|zoom|vpn|chrome|firefox|edge|sap|salesforce|'
-        r'servicenow|jira|github|docker|kubernetes|active directory|ad)\b', text)
-    if software: entities['software'] = list(set(software))
-
-    # Error patterns
-    errors = re.findall(
-        r'\b(error|crash|freeze|hang|timeout|not responding|blue screen|'
-        r'bsod|kernel panic|failed|corrupt|malware|virus|not charging|'
-        r'connection refused|access denied|permission denied|404|500)\b', text)
-    if errors: entities['errors'] = list(set(errors))
-
-    # Brands / Products
-    brands = re.findall(
-        r'\b(dell|hp|lenovo|cisco|apple|microsoft|google|samsung|sony|'
-        r'logitech|intel|amd|nvidia|aws|azure|gcp)\b', text)
-    if brands: entities['brands'] = list(set(brands))
-
-    return entities
+    return scan_ticket(subject, body)[0]
 
 # ─────────────────────────────────────────────
 # Database
 # ─────────────────────────────────────────────
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    with get_db() as conn:
-        conn.executescript("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            subject TEXT NOT NULL,
-            body TEXT NOT NULL,
-            category TEXT,
-            queue TEXT,
-            priority TEXT,
-            status TEXT DEFAULT 'Pending',
-            confidence_category REAL DEFAULT 0,
-            confidence_priority REAL DEFAULT 0,
-            entities TEXT DEFAULT '{}',
-            admin_notes TEXT DEFAULT '',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        );
-        """)
-
 init_db()
 
 # ─────────────────────────────────────────────
@@ -154,6 +100,16 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Authentication required'}), 401
+        if session.get('user_role') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
 # ─────────────────────────────────────────────
 # PAGE ROUTES
 # ─────────────────────────────────────────────
@@ -268,20 +224,117 @@ def me():
 # ─────────────────────────────────────────────
 # PREDICT/ANALYZE APIs
 # ─────────────────────────────────────────────
-@app.route('/api/analyze', methods=['POST'])
-def analyze():
-    """Analyze ticket without saving (no auth required)"""
-    data    = request.get_json()
-    subject = data.get('subject', '')
-    body    = data.get('body', '')
+MAX_BATCH_SIZE = 500
 
-    if not subject or not body:
-        return jsonify({'error': 'Subject and body are required'}), 400
+# Concurrent requests' cache misses are scored together: the first caller
+# waits up to INFERENCE_BATCH_WINDOW_MS for others (set it to -1 to disable)
+_batch_window_ms = float(os.environ.get('INFERENCE_BATCH_WINDOW_MS', 2))
+BATCH_SIZE_ITEMS = metrics.registry.histogram(
+    'smartdesk_inference_batch_size', 'Texts per model call',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+BATCH_QUEUE_SECONDS = metrics.registry.histogram(
+    'smartdesk_inference_queue_seconds', 'Time a request waited for its model batch')
+
+def observe_batch(size, delays):
+    BATCH_SIZE_ITEMS.observe(size)
+    for delay in delays:
+        BATCH_QUEUE_SECONDS.observe(delay)
 
-    full_text   = f"{subject} {body}"
-    clean_text  = preprocess(full_text)
+def score_batch(bundle, texts):
+    """One model call; the three heads share a single feature matrix and matrix product."""
+    model = bundle.model
+    if hasattr(model, 'predict_proba_features'):
+        with stage('featurize'):
+            X = model.transform(texts)
+        with stage('model'):
+            return model.predict_proba_features(X)
+    with stage('model'):
+        return model.predict_proba(texts)
 
-    result = {
+inference_batcher = MicroBatcher(
+    score_batch,
+    window=_batch_window_ms / 1000 if _batch_window_ms >= 0 else None,
+    max_batch=int(os.environ.get('INFERENCE_MAX_BATCH', 256)),
+    observer=observe_batch,
+)
+
+RULE_OVERRIDES  = metrics.registry.counter(
+    'smartdesk_rule_overrides_total', 'Model priorities raised to high by urgency keywords')
+MODEL_FALLBACKS = metrics.registry.counter(
+    'smartdesk_model_fallbacks_total', 'Tickets given default labels instead of model output',
+    ('reason',))
+
+# Model head -> confidence field reported with its label
+HEAD_FIELDS = {'category': 'confidence_category', 'queue': None,
+               'priority': 'confidence_priority'}
+
+def predict_labels(clean_texts, bundle):
+    """Model labels and confidences per cleaned text, None when unavailable.
+
+    Cached texts skip the model entirely; the rest (deduplicated) are scored
+    in one call, shared with concurrent requests by the micro-batcher, and
+    written back to the cache.
+    """
+    if bundle is None:
+        MODEL_FALLBACKS.inc(len(clean_texts), reason='no_model')
+        return [None] * len(clean_texts)
+
+    with stage('cache_lookup'):
+        labels = prediction_cache.get_many(clean_texts, bundle.version)
+    missing = [t for t in dict.fromkeys(clean_texts) if t not in labels]
+
+    if missing:
+        try:
+            # A profiled request scores in its own thread so the model shows up in its profile
+            head_probs = score_batch(bundle, missing) if profiling.active() \
+                else inference_batcher.submit(bundle, missing)
+            classes    = bundle.model.classes_
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            MODEL_FALLBACKS.inc(len(missing), reason='error')
+            head_probs = {}
+
+        fresh, complete = {}, True
+        if head_probs:
+            fresh = {text: {} for text in missing}
+            # Heads are read independently: one that failed (or is missing)
+            # keeps its defaults without losing the other labels
+            for head, confidence in HEAD_FIELDS.items():
+                try:
+                    picks = []
+                    for probs in head_probs[head]:
+                        i = probs.argmax()
+                        picks.append((str(classes[head][i]), round(float(probs[i]), 3)))
+                except Exception as e:
+                    print(f"Prediction error ({head}): {e}")
+                    MODEL_FALLBACKS.inc(len(missing), reason=f'{head}_error')
+                    complete = False
+                    continue
+                for text, (label, score) in zip(missing, picks):
+                    fresh[text][head] = label
+                    if confidence:
+                        fresh[text][confidence] = score
+
+        # Partial results are not cached, so the next request retries the head
+        if complete:
+            prediction_cache.set_many(fresh, bundle.version)
+        labels.update(fresh)
+
+    return [labels.get(t) for t in clean_texts]
+
+def classify_tickets(tickets):
+    """Classify a list of (subject, body) pairs.
+
+    The batch is vectorized once and every head scores the same feature
+    matrix, so the pipeline overhead is paid per request instead of per
+    ticket and per model. Texts seen before are served from the cache.
+    """
+    with stage('preprocess'):
+        clean_texts = preprocess_batch(f"{subject} {body}" for subject, body in tickets)
+    with stage('entities'):
+        scans = [scan_ticket(subject, body) for subject, body in tickets]
+
+    results = [{
         'subject': subject,
         'category': 'Incident',
         'queue': 'Technical Support',
@@ -289,48 +342,123 @@ def analyze():
         'confidence_category': 0.85,
         'confidence_priority': 0.75,
         'rule_override': False,
-        'entities': extract_entities(subject, body),
-    }
+        'entities': entities,
+    } for (subject, body), (entities, _) in zip(tickets, scans)]
 
-    if category_model:
-        try:
-            cat_probs = category_model.predict_proba([clean_text])[0]
-            cat_classes = category_model.classes_
-            cat_idx = cat_probs.argmax()
-            result['category']            = cat_classes[cat_idx]
-            result['confidence_category'] = round(float(cat_probs[cat_idx]), 3)
-        except Exception as e:
-            print(f"Category prediction error: {e}")
-
-    if queue_model:
-        try:
-            q_probs   = queue_model.predict_proba([clean_text])[0]
-            q_classes = queue_model.classes_
-            result['queue'] = q_classes[q_probs.argmax()]
-        except Exception as e:
-            print(f"Queue prediction error: {e}")
-
-    if priority_model:
-        try:
-            pri_probs   = priority_model.predict_proba([clean_text])[0]
-            pri_classes = priority_model.classes_
-            pri_idx     = pri_probs.argmax()
-            result['priority']            = pri_classes[pri_idx]
-            result['confidence_priority'] = round(float(pri_probs[pri_idx]), 3)
-        except Exception as e:
-            print(f"Priority prediction error: {e}")
+    bundle = registry.current
+    for result, labels in zip(results, predict_labels(clean_texts, bundle)):
+        result['model_version'] = bundle.version if bundle else None
+        if labels:
+            result.update(labels)
 
     # Rule-based override
-    text_lower = full_text.lower()
-    for kw in HIGH_URGENCY_KEYWORDS:
-        if kw in text_lower:
-            if result['priority'] != 'high':
+    with stage('rule_override'):
+        for result, (_, kw) in zip(results, scans):
+            if kw and result['priority'] != 'high':
                 result['priority']      = 'high'
                 result['rule_override'] = True
                 result['override_keyword'] = kw
-            break
+                RULE_OVERRIDES.inc()
+
+    return results
 
-    return jsonify(result)
+# Tickets submitted with async=true are saved as 'Classifying' and labelled
+# by a background worker; ASYNC_CLASSIFICATION=1 makes that the default.
+ASYNC_DEFAULT  = os.environ.get('ASYNC_CLASSIFICATION', '0') == '1'
+MAX_POLL_WAIT  = 2.0     # a waiting poll holds a gunicorn thread, so keep it short
+
+classification_worker = ClassificationWorker(
+    classify_tickets, threads=int(os.environ.get('CLASSIFY_WORKER_THREADS', 1)))
+
+@app.before_request
+def start_classification_worker():
+    classification_worker.ensure_started()
+
+def wants_async(data):
+    flag = request.args.get('async', (data or {}).get('async', ASYNC_DEFAULT))
+    return flag in (True, 1) or str(flag).lower() in ('1', 'true', 'yes')
+
+def enqueue_tickets(user_id, tickets):
+    """Save tickets unlabelled with a classification job each; returns their ids."""
+    with stage('db_insert'), get_db() as conn:
+        conn.executemany(
+            'INSERT INTO tickets (user_id, subject, body, status) VALUES (?,?,?,?)',
+            [(user_id, subject, body, CLASSIFYING_STATUS) for subject, body in tickets]
+        )
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        ids = list(range(last_id - len(tickets) + 1, last_id + 1))
+        enqueue(conn, ids)
+    classification_worker.notify()
+    return ids
+
+def queued_response(ticket_id):
+    return {'ticket_id': ticket_id, 'status': CLASSIFYING_STATUS,
+            'poll': url_for('get_ticket', tid=ticket_id)}
+
+def parse_ticket_batch(data):
+    """Validate a batch payload; returns (tickets, error_message)."""
+    items = (data or {}).get('tickets')
+    if not isinstance(items, list) or not items:
+        return None, 'A non-empty "tickets" list is required'
+    if len(items) > MAX_BATCH_SIZE:
+        return None, f'At most {MAX_BATCH_SIZE} tickets per batch'
+
+    tickets = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return None, f'Ticket {i}: expected an object'
+        subject = item.get('subject', '')
+        body    = item.get('body', '')
+        if not subject or not body:
+            return None, f'Ticket {i}: subject and body are required'
+        tickets.append((subject, body))
+    return tickets, None
+
+def save_tickets(user_id, tickets, results):
+    """Insert classified tickets in one transaction and set their ticket_id."""
+    rows = [
+        (user_id, subject, body,
+         result['category'], result['queue'], result['priority'],
+         result['confidence_category'], result['confidence_priority'],
+         json.dumps(result['entities']))
+        for (subject, body), result in zip(tickets, results)
+    ]
+    with stage('db_insert'), get_db() as conn:
+        conn.executemany(
+            """INSERT INTO tickets
+               (user_id, subject, body, category, queue, priority,
+                confidence_category, confidence_priority, entities)
+               VALUES (?,?,?,?,?,?,?,?,?)""",
+            rows
+        )
+        # The write lock is held for the whole transaction, so the new
+        # AUTOINCREMENT ids are contiguous and end at last_insert_rowid().
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    first_id = last_id - len(rows) + 1
+    for offset, result in enumerate(results):
+        result['ticket_id'] = first_id + offset
+
+@app.route('/api/analyze', methods=['POST'])
+def analyze():
+    """Analyze ticket without saving (no auth required)"""
+    data    = request.get_json()
+    subject = data.get('subject', '')
+    body    = data.get('body', '')
+
+    if not subject or not body:
+        return jsonify({'error': 'Subject and body are required'}), 400
+
+    return jsonify(classify_tickets([(subject, body)])[0])
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a batch of tickets without saving (no auth required)"""
+    tickets, error = parse_ticket_batch(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+
+    results = classify_tickets(tickets)
+    return jsonify({'count': len(results), 'results': results})
 
 @app.route('/api/predict', methods=['POST'])
 @login_required
@@ -343,102 +471,194 @@ def predict():
     if not subject or not body:
         return jsonify({'error': 'Subject and body are required'}), 400
 
-    full_text   = f"{subject} {body}"
-    clean_text  = preprocess(full_text)
+    tickets = [(subject, body)]
+    if wants_async(data):
+        ticket_id, = enqueue_tickets(session['user_id'], tickets)
+        return jsonify(queued_response(ticket_id)), 202
 
-    result = {
-        'subject': subject,
-        'category': 'Incident',
-        'queue': 'Technical Support',
-        'priority': 'medium',
-        'confidence_category': 0.85,
-        'confidence_priority': 0.75,
-        'rule_override': False,
-        'entities': extract_entities(subject, body),
-    }
+    results = classify_tickets(tickets)
+    save_tickets(session['user_id'], tickets, results)
+    return jsonify(results[0])
 
-    if category_model:
-        try:
-            cat_probs = category_model.predict_proba([clean_text])[0]
-            cat_classes = category_model.classes_
-            cat_idx = cat_probs.argmax()
-            result['category']            = cat_classes[cat_idx]
-            result['confidence_category'] = round(float(cat_probs[cat_idx]), 3)
-        except Exception as e:
-            print(f"Category prediction error: {e}")
+@app.route('/api/predict/batch', methods=['POST'])
+@login_required
+def predict_batch():
+    """Analyze AND save a batch of tickets (requires auth)"""
+    data = request.get_json(silent=True)
+    tickets, error = parse_ticket_batch(data)
+    if error:
+        return jsonify({'error': error}), 400
 
-    if queue_model:
-        try:
-            q_probs   = queue_model.predict_proba([clean_text])[0]
-            q_classes = queue_model.classes_
-            result['queue'] = q_classes[q_probs.argmax()]
-        except Exception as e:
-            print(f"Queue prediction error: {e}")
+    if wants_async(data):
+        ids = enqueue_tickets(session['user_id'], tickets)
+        return jsonify({'count': len(ids), 'results': [queued_response(i) for i in ids]}), 202
 
-    if priority_model:
-        try:
-            pri_probs   = priority_model.predict_proba([clean_text])[0]
-            pri_classes = priority_model.classes_
-            pri_idx     = pri_probs.argmax()
-            result['priority']            = pri_classes[pri_idx]
-            result['confidence_priority'] = round(float(pri_probs[pri_idx]), 3)
-        except Exception as e:
-            print(f"Priority prediction error: {e}")
+    results = classify_tickets(tickets)
+    save_tickets(session['user_id'], tickets, results)
+    return jsonify({'count': len(results), 'results': results})
 
-    # Rule-based override
-    text_lower = full_text.lower()
-    for kw in HIGH_URGENCY_KEYWORDS:
-        if kw in text_lower:
-            if result['priority'] != 'high':
-                result['priority']      = 'high'
-                result['rule_override'] = True
-                result['override_keyword'] = kw
-            break
+@app.route('/api/admin/cache')
+@admin_required
+def cache_stats():
+    return jsonify(prediction_cache.stats())
 
-    # Save to DB
-    with get_db() as conn:
-        cur = conn.execute(
-            """INSERT INTO tickets
-               (user_id, subject, body, category, queue, priority,
-                confidence_category, confidence_priority, entities)
-               VALUES (?,?,?,?,?,?,?,?,?)""",
-            (session['user_id'], subject, body,
-             result['category'], result['queue'], result['priority'],
-             result['confidence_category'], result['confidence_priority'],
-             json.dumps(result['entities']))
-        )
-        result['ticket_id'] = cur.lastrowid
+@app.route('/api/admin/batching')
+@admin_required
+def batching_stats():
+    return jsonify(inference_batcher.stats())
+
+@app.route('/api/admin/jobs')
+@admin_required
+def job_stats():
+    return jsonify(classification_worker.stats())
+
+@app.route('/api/admin/models')
+@admin_required
+def model_status():
+    return jsonify(registry.status())
 
-    return jsonify(result)
+@app.route('/api/admin/models/reload', methods=['POST'])
+@admin_required
+def reload_model():
+    """Load a version in the background and make it the active one.
+
+    The new version is validated and swapped in by this worker first; the
+    CURRENT pointer is only moved once that succeeds, and other workers
+    follow the pointer on their next request.
+    """
+    version = (request.get_json(silent=True) or {}).get('version') \
+        or registry.active_version()
+    if version and version not in registry.versions():
+        return jsonify({'error': f'Unknown model version: {version}'}), 404
+    if not registry.reload_async(version, publish=True):
+        return jsonify({'error': 'A model reload is already in progress'}), 409
+    return jsonify({'success': True, 'loading': version or LEGACY_VERSION}), 202
 
 # ─────────────────────────────────────────────
 # TICKETS API
 # ─────────────────────────────────────────────
+TICKET_FIELDS  = ('id', 'user_id', 'subject', 'body', 'category', 'queue', 'priority',
+                  'status', 'confidence_category', 'confidence_priority',
+                  'entities', 'admin_notes', 'created_at', 'updated_at')
+USER_FIELDS    = {'user_name': 'users.name', 'user_email': 'users.email'}   # admin only
+TICKET_FILTERS = ('status', 'queue', 'category')
+TICKET_SORTS   = {
+    # sort -> (keyset columns, direction); both walk an index end to end
+    'date':     (('tickets.created_at', 'tickets.id'), 'DESC'),
+    'priority': ((PRIORITY_RANK, 'tickets.id'), 'ASC'),
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE     = 500
+
+def encode_cursor(sort, keys):
+    raw = json.dumps([sort, *keys], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, sort):
+    """Keyset values from a cursor; raises ValueError if it is malformed."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(data, list) or len(data) != 3 or data[0] != sort:
+        raise ValueError('Invalid cursor for this sort order')
+    return data[1:]
+
 @app.route('/api/tickets')
 @login_required
 def my_tickets():
-    sort = request.args.get('sort', 'date')
-    order_clause = 'created_at DESC' if sort == 'date' else \
-                   "CASE priority WHEN 'high' THEN 1 WHEN 'medium' THEN 2 ELSE 3 END"
+    """List tickets, newest first (sort=date) or most urgent first (sort=priority).
 
-    # If admin, show all tickets with user info
-    if session.get('user_role') == 'admin':
-        with get_db() as conn:
-            tickets = conn.execute(
-                f"""SELECT t.*, u.name as user_name, u.email as user_email 
-                    FROM tickets t 
-                    JOIN users u ON t.user_id = u.id 
-                    ORDER BY {order_clause}"""
-            ).fetchall()
+    Optional filters: status, queue, category. fields=id,subject,... limits
+    the columns returned. With limit or cursor the response is one page,
+    {"tickets": [...], "next_cursor": ...}; without them it is the full
+    array, as before.
+    """
+    is_admin = session.get('user_role') == 'admin'
+    sort = 'date' if request.args.get('sort', 'date') == 'date' else 'priority'
+    keys, direction = TICKET_SORTS[sort]
+    paged = 'limit' in request.args or 'cursor' in request.args
+
+    allowed = TICKET_FIELDS + (tuple(USER_FIELDS) if is_admin else ())
+    if 'fields' in request.args:
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+        fields = ['id'] + [f for f in dict.fromkeys(fields) if f != 'id']
     else:
-        # Regular users only see their own tickets
-        with get_db() as conn:
-            tickets = conn.execute(
-                f'SELECT * FROM tickets WHERE user_id=? ORDER BY {order_clause}',
-                (session['user_id'],)
-            ).fetchall()
+        fields = list(allowed)
 
-    return jsonify([dict(t) for t in tickets])
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        after = decode_cursor(request.args['cursor'], sort) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    columns = [f'{USER_FIELDS[f]} AS {f}' if f in USER_FIELDS else f'tickets.{f}'
+               for f in fields]
+    columns += [f'{key} AS _key{i}' for i, key in enumerate(keys)]
+    joins = ' JOIN users ON users.id = tickets.user_id' \
+        if any(f in USER_FIELDS for f in fields) else ''
+
+    where, params = [], []
+    if not is_admin:
+        where.append('tickets.user_id = ?')
+        params.append(session['user_id'])
+    for name in TICKET_FILTERS:
+        if request.args.get(name):
+            where.append(f'tickets.{name} = ?')
+            params.append(request.args[name])
+    if after:
+        # The redundant bound on the leading key lets SQLite seek the index
+        # instead of scanning from the start on every page
+        op = '<' if direction == 'DESC' else '>'
+        where.append(f"{keys[0]} {op}= ? AND ({', '.join(keys)}) {op} (?, ?)")
+        params.extend([after[0], *after])
+
+    sql = (f"SELECT {', '.join(columns)} FROM tickets{joins}"
+           f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+           f" ORDER BY {', '.join(f'{k} {direction}' for k in keys)}")
+    if paged:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)   # one extra row tells us whether a next page exists
+
+    with get_db() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    next_cursor = None
+    if paged and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, [rows[-1][f'_key{i}'] for i in range(len(keys))])
+    tickets = [{f: row[f] for f in fields} for row in rows]
+
+    if not paged:
+        return jsonify(tickets)
+    return jsonify({'tickets': tickets, 'next_cursor': next_cursor})
+
+@app.route('/api/tickets/<int:tid>')
+@login_required
+def get_ticket(tid):
+    """One ticket. ?wait=N long-polls up to N seconds while it is still classifying."""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_POLL_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    deadline = time.monotonic() + wait
+
+    conn = get_db()
+    while True:
+        ticket = conn.execute('SELECT * FROM tickets WHERE id=?', (tid,)).fetchone()
+        if not ticket:
+            return jsonify({'error': 'Ticket not found'}), 404
+        if session.get('user_role') != 'admin' and ticket['user_id'] != session['user_id']:
+            return jsonify({'error': 'Permission denied'}), 403
+        if ticket['status'] != CLASSIFYING_STATUS or time.monotonic() >= deadline:
+            return jsonify(dict(ticket))
+        time.sleep(0.1)
 
 @app.route('/api/tickets/<int:tid>', methods=['PATCH'])
 @login_required
@@ -488,6 +708,101 @@ def delete_ticket(tid):
                      (tid, session['user_id']))
     return jsonify({'success': True})
 
+# Corrections are learned once this many are pending (0: only on request)
+ONLINE_LEARNING_BATCH = int(os.environ.get('ONLINE_LEARNING_BATCH', 20))
+correction_publisher = CorrectionPublisher(registry)
+
+@app.route('/api/admin/tickets/<int:tid>/corrections', methods=['POST'])
+@admin_required
+def correct_ticket(tid):
+    """Fix a ticket's category/queue/priority and record it for online learning."""
+    data = request.get_json(silent=True) or {}
+    changes = {field: data[field] for field in CORRECTABLE if data.get(field)}
+    if not changes:
+        return jsonify({'error': f'Provide at least one of: {", ".join(CORRECTABLE)}'}), 400
+    bundle = registry.current
+    if bundle is None:
+        return jsonify({'error': 'Models are not loaded'}), 503
+    for field, value in changes.items():
+        allowed = [str(c) for c in bundle.model.classes_[field]]
+        if value not in allowed:
+            return jsonify({'error': f'Unknown {field}: {value}', 'allowed': allowed}), 400
+
+    with get_db() as conn:
+        ticket = conn.execute('SELECT * FROM tickets WHERE id=?', (tid,)).fetchone()
+        if not ticket:
+            return jsonify({'error': 'Ticket not found'}), 404
+        changes = {f: v for f, v in changes.items() if v != ticket[f]}
+        if changes:
+            conn.execute(
+                f'UPDATE tickets SET {", ".join(f"{f}=?" for f in changes)}, updated_at=? WHERE id=?',
+                (*changes.values(), datetime.now(), tid)
+            )
+            conn.executemany(
+                """INSERT INTO ticket_corrections (ticket_id, admin_id, field, old_value, new_value)
+                   VALUES (?,?,?,?,?)""",
+                [(tid, session['user_id'], f, ticket[f], v) for f, v in changes.items()]
+            )
+        pending = conn.execute(
+            """SELECT COUNT(*) FROM ticket_corrections c JOIN tickets t ON t.id = c.ticket_id
+               WHERE c.learned_in IS NULL""").fetchone()[0]
+
+    if ONLINE_LEARNING_BATCH and pending >= ONLINE_LEARNING_BATCH:
+        correction_publisher.start(ONLINE_LEARNING_BATCH)
+    return jsonify({'success': True, 'corrected': changes, 'pending': pending})
+
+@app.route('/api/admin/corrections')
+@admin_required
+def correction_status():
+    conn = get_db()
+    pending, learned = conn.execute(
+        """SELECT COUNT(*) FILTER (WHERE c.learned_in IS NULL AND t.id IS NOT NULL),
+                  COUNT(*) FILTER (WHERE c.learned_in IS NOT NULL)
+           FROM ticket_corrections c LEFT JOIN tickets t ON t.id = c.ticket_id"""
+    ).fetchone()
+    recent = conn.execute(
+        'SELECT * FROM ticket_corrections ORDER BY id DESC LIMIT 50').fetchall()
+    return jsonify({
+        'pending': pending,
+        'learned': learned,
+        'batch_size': ONLINE_LEARNING_BATCH,
+        'publishing': correction_publisher.running,
+        'last_version': correction_publisher.last_version,
+        'last_error': correction_publisher.last_error,
+        'recent': [dict(r) for r in recent],
+    })
+
+@app.route('/api/admin/corrections/publish', methods=['POST'])
+@admin_required
+def publish_corrections():
+    """Learn all pending corrections now and activate the resulting version."""
+    if not correction_publisher.start():
+        return jsonify({'error': 'Corrections are already being learned'}), 409
+    return jsonify({'success': True, 'publishing': True}), 202
+
+@app.route('/api/admin/tickets/export')
+@admin_required
+def export_tickets():
+    """Stream every ticket as NDJSON (default) or CSV, optionally gzipped.
+
+    ?format=ndjson|csv&from=YYYY-MM-DD&to=YYYY-MM-DD&gzip=1
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    filename = f"tickets-{datetime.now(timezone.utc):%Y%m%d}.{fmt}" + ('.gz' if compress else '')
+    return Response(
+        export_stream(fmt, start, end, compress),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
 # ─────────────────────────────────────────────
 # ANALYTICS / STATS API
 # ─────────────────────────────────────────────
@@ -497,86 +812,247 @@ def stats():
     uid = session['user_id']
     is_admin = session.get('user_role') == 'admin'
     today = date.today().isoformat()
+    # Admins read the global counters, users their own scope
+    scope = COUNTER_ALL_USERS if is_admin else uid
 
     with get_db() as conn:
-        if is_admin:
-            # Admin sees all tickets stats
-            total = conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
-            today_count = conn.execute(
-                "SELECT COUNT(*) FROM tickets WHERE date(created_at)=?", (today,)
-            ).fetchone()[0]
-            pending = conn.execute(
-                "SELECT COUNT(*) FROM tickets WHERE status='Pending'"
-            ).fetchone()[0]
-            resolved = conn.execute(
-                "SELECT COUNT(*) FROM tickets WHERE status='Resolved'"
-            ).fetchone()[0]
-            by_category = conn.execute(
-                "SELECT category, COUNT(*) as cnt FROM tickets GROUP BY category"
-            ).fetchall()
-            by_priority = conn.execute(
-                "SELECT priority, COUNT(*) as cnt FROM tickets GROUP BY priority"
-            ).fetchall()
-            by_status = conn.execute(
-                "SELECT status, COUNT(*) as cnt FROM tickets GROUP BY status"
+        with stage('stats_counters'):
+            rows = conn.execute(
+                """SELECT dim, value, cnt FROM ticket_counters
+                   WHERE user_id=? AND dim IN ('total','status','category','priority')
+                   AND cnt != 0""",
+                (scope,)
             ).fetchall()
+        with stage('stats_daily'):
             daily = conn.execute(
-                """SELECT date(created_at) as day, COUNT(*) as cnt
-                   FROM tickets
-                   WHERE created_at >= date('now','-6 days')
-                   GROUP BY day ORDER BY day"""
-            ).fetchall()
-        else:
-            # Regular users see only their tickets
-            total = conn.execute(
-                'SELECT COUNT(*) FROM tickets WHERE user_id=?', (uid,)
-            ).fetchone()[0]
-            today_count = conn.execute(
-                "SELECT COUNT(*) FROM tickets WHERE user_id=? AND date(created_at)=?",
-                (uid, today)
-            ).fetchone()[0]
-            pending = conn.execute(
-                "SELECT COUNT(*) FROM tickets WHERE user_id=? AND status='Pending'",
-                (uid,)
-            ).fetchone()[0]
-            resolved = conn.execute(
-                "SELECT COUNT(*) FROM tickets WHERE user_id=? AND status='Resolved'",
-                (uid,)
-            ).fetchone()[0]
-            by_category = conn.execute(
-                "SELECT category, COUNT(*) as cnt FROM tickets WHERE user_id=? GROUP BY category",
-                (uid,)
-            ).fetchall()
-            by_priority = conn.execute(
-                "SELECT priority, COUNT(*) as cnt FROM tickets WHERE user_id=? GROUP BY priority",
-                (uid,)
-            ).fetchall()
-            by_status = conn.execute(
-                "SELECT status, COUNT(*) as cnt FROM tickets WHERE user_id=? GROUP BY status",
-                (uid,)
-            ).fetchall()
-            daily = conn.execute(
-                """SELECT date(created_at) as day, COUNT(*) as cnt
-                   FROM tickets WHERE user_id=?
-                   AND created_at >= date('now','-6 days')
-                   GROUP BY day ORDER BY day""",
-                (uid,)
+                """SELECT value as day, cnt FROM ticket_counters
+                   WHERE user_id=? AND dim='day' AND value >= date('now','-6 days')
+                   AND cnt != 0 ORDER BY value""",
+                (scope,)
             ).fetchall()
+        with stage('stats_today'):
+            today_row = conn.execute(
+                "SELECT cnt FROM ticket_counters WHERE user_id=? AND dim='day' AND value=?",
+                (scope, today)
+            ).fetchone()
+
+    counts = {'total': {}, 'status': {}, 'category': {}, 'priority': {}}
+    for r in rows:
+        # '' stands in for NULL in the counters' primary key
+        counts[r['dim']][r['value'] or None] = r['cnt']
 
+    def breakdown(dim):
+        return [{dim: value, 'cnt': cnt}
+                for value, cnt in sorted(counts[dim].items(),
+                                         key=lambda kv: (kv[0] is not None, kv[0] or ''))]
+
+    total   = counts['total'].get(None, 0)
+    pending = counts['status'].get('Pending', 0)
     return jsonify({
         'total': total,
-        'today': today_count,
+        'today': today_row['cnt'] if today_row else 0,
         'pending': pending,
-        'resolved': resolved,
-        'attended': total - pending,
-        'by_category': [dict(r) for r in by_category],
-        'by_priority': [dict(r) for r in by_priority],
-        'by_status':   [dict(r) for r in by_status],
+        'resolved': counts['status'].get('Resolved', 0),
+        'attended': total - pending - counts['status'].get(CLASSIFYING_STATUS, 0),
+        'by_category': breakdown('category'),
+        'by_priority': breakdown('priority'),
+        'by_status':   breakdown('status'),
         'daily':       [dict(r) for r in daily],
-        'model_stats': model_stats,
+        'model_stats': registry.current.stats if registry.current else {},
         'is_admin': is_admin
     })
 
+TIMESERIES_GROUPS   = ('none', 'queue', 'category', 'priority')
+TIMESERIES_MAX_DAYS = {'day': 3660, 'hour': 31}
+
+@app.route('/api/stats/timeseries')
+@admin_required
+def stats_timeseries():
+    """Ticket counts per day or hour over [from, to], served from rollups."""
+    interval = request.args.get('interval', 'day')
+    group_by = request.args.get('group_by', 'none')
+    if interval not in TIMESERIES_MAX_DAYS:
+        return jsonify({'error': 'interval must be day or hour'}), 400
+    if group_by not in TIMESERIES_GROUPS:
+        return jsonify({'error': f'group_by must be one of {", ".join(TIMESERIES_GROUPS)}'}), 400
+
+    try:
+        # Buckets are UTC, like created_at
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args \
+            else datetime.now(timezone.utc).date()
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args \
+            else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD dates'}), 400
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    if (end - start).days + 1 > TIMESERIES_MAX_DAYS[interval]:
+        return jsonify({'error': f'At most {TIMESERIES_MAX_DAYS[interval]} days '
+                                 f'per {interval} series'}), 400
+
+    if interval == 'day':
+        buckets = [(start + timedelta(days=i)).isoformat()
+                   for i in range((end - start).days + 1)]
+    else:
+        first = datetime.combine(start, datetime.min.time())
+        buckets = [(first + timedelta(hours=i)).strftime('%Y-%m-%d %H:00')
+                   for i in range(((end - start).days + 1) * 24)]
+
+    dim = 'all' if group_by == 'none' else group_by
+    with stage('stats_timeseries'), get_db() as conn:
+        rows = conn.execute(
+            """SELECT bucket, value, cnt FROM ticket_rollups
+               WHERE granularity=? AND dim=? AND bucket BETWEEN ? AND ?
+               AND cnt != 0""",
+            (interval, dim, buckets[0], buckets[-1])
+        ).fetchall()
+
+    index = {b: i for i, b in enumerate(buckets)}
+    series = {}
+    for r in rows:
+        counts = series.setdefault(r['value'] or None, [0] * len(buckets))
+        counts[index[r['bucket']]] = r['cnt']
+    totals = [sum(c) for c in zip(*series.values())] if series else [0] * len(buckets)
+
+    return jsonify({
+        'interval': interval,
+        'group_by': group_by,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'buckets': buckets,
+        'total': totals,
+        'series': [] if group_by == 'none' else [
+            {'key': key, 'counts': counts}
+            for key, counts in sorted(series.items(), key=lambda kv: -sum(kv[1]))
+        ],
+    })
+
+# ─────────────────────────────────────────────
+# METRICS
+# ─────────────────────────────────────────────
+# Prometheus text format on /metrics. Set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" (admins can always read it).
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+HTTP_REQUESTS = metrics.registry.counter(
+    'smartdesk_http_requests_total', 'HTTP requests by route and status',
+    ('method', 'endpoint', 'status'))
+HTTP_SECONDS = metrics.registry.histogram(
+    'smartdesk_http_request_seconds', 'HTTP request latency by route', ('endpoint',))
+
+def _cache_counts():
+    s = prediction_cache.stats()
+    return {'hit': s['hits'], 'miss': s['misses']}
+
+metrics.registry.callback('smartdesk_prediction_cache_lookups_total', 'counter',
+                          'Prediction cache lookups by result', _cache_counts, ('result',))
+metrics.registry.callback('smartdesk_prediction_cache_entries', 'gauge',
+                          'Entries in the in-process prediction cache',
+                          lambda: prediction_cache.stats()['size'])
+metrics.registry.callback('smartdesk_inference_batches_total', 'counter',
+                          'Model calls made by the micro-batcher',
+                          lambda: inference_batcher.batches)
+metrics.registry.callback('smartdesk_model_info', 'gauge',
+                          'Model version loaded by each worker (value: worker count)',
+                          lambda: {registry.current.version: 1} if registry.current else {},
+                          ('version',))
+metrics.registry.callback('smartdesk_classification_jobs_total', 'counter',
+                          'Background classification jobs by outcome',
+                          lambda: {'processed': classification_worker.processed,
+                                   'failed': classification_worker.failed}, ('outcome',))
+
+def _job_queue():
+    s = classification_worker.stats()
+    return {'queued': s['queued'], 'oldest_age_seconds': s['oldest_age'] or 0}
+
+metrics.registry.callback('smartdesk_classification_queue', 'gauge',
+                          'Classification job queue depth and oldest job age',
+                          _job_queue, ('measure',), shared=True)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    metrics.registry.ensure_flusher()
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN and session.get('user_role') != 'admin' \
+            and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Metrics token required'}), 401
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# ─────────────────────────────────────────────
+# PROFILING
+# ─────────────────────────────────────────────
+# Admins profile a request with "X-Profile: sample|cprofile" or ?profile=...;
+# PROFILE_SAMPLE_RATE profiles a random share of all requests.
+# The profile name is returned in the X-Profile-Name response header.
+@app.before_request
+def start_profiling():
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    if not flag and not profiling.SAMPLE_RATE:
+        return
+    if request.path.startswith('/api/admin/profiles') or request.path == '/metrics':
+        return
+    mode = profiling.requested(flag, session.get('user_role') == 'admin')
+    if mode:
+        g.profiler = profiling.RequestProfiler(mode)
+        g.profiler.start()
+
+@app.after_request
+def tag_profile(response):
+    profiler = g.get('profiler')
+    if profiler is not None:
+        profiler.status = response.status_code
+        response.headers['X-Profile-Name'] = profiler.name
+    return response
+
+@app.teardown_request
+def finish_profiling(exc):
+    # teardown also runs when the handler raised, so the sampler always stops
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    try:
+        profiler.finish(method=request.method, path=request.full_path.rstrip('?'),
+                        endpoint=request.url_rule.rule if request.url_rule else None,
+                        user_id=session.get('user_id'),
+                        error=repr(exc) if exc else None)
+    except OSError as e:
+        print(f"⚠️  Could not save profile {profiler.name}: {e}")
+
+@app.route('/api/admin/profiles')
+@admin_required
+def list_profiles():
+    limit = min(request.args.get('limit', 50, type=int), profiling.KEEP_PROFILES)
+    return jsonify({'directory': profiling.PROFILE_DIR,
+                    'sample_rate': profiling.SAMPLE_RATE,
+                    'profiles': profiling.recent(limit=limit)})
+
+@app.route('/api/admin/profiles/<name>')
+@admin_required
+def get_profile(name):
+    # <name>.folded / .prof / .txt / .json as stored, or <name>.svg rendered from .folded
+    stem, ext = os.path.splitext(name)
+    if os.path.basename(name) != name or ext not in ('.folded', '.prof', '.txt', '.json', '.svg'):
+        return jsonify({'error': 'Unknown profile file'}), 404
+    path = os.path.join(profiling.PROFILE_DIR, stem + ('.folded' if ext == '.svg' else ext))
+    if not os.path.exists(path):
+        return jsonify({'error': 'Profile not found'}), 404
+    if ext == '.svg':
+        svg = profiling.flamegraph_svg(profiling.read_folded(path), title=stem)
+        return Response(svg, mimetype='image/svg+xml')
+    return send_file(os.path.abspath(path), as_attachment=ext == '.prof')
+
 # ─────────────────────────────────────────────
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
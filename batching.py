@@ -0,0 +1,155 @@
+"""
+Inference Micro-Batching
+Collects model calls from concurrent request threads for a short window (or
+until a size cap), runs them as one vectorized call and hands each caller
+its slice of the output. Batch-size and queueing-delay metrics are kept so
+the window can be tuned for throughput versus tail latency.
+"""
+
+import os, time, queue, threading
+from collections import deque
+
+import numpy as np
+
+def _slice(result, start, stop):
+    if isinstance(result, dict):
+        return {k: v[start:stop] for k, v in result.items()}
+    return result[start:stop]
+
+def _concat(chunks):
+    return [item for chunk in chunks for item in chunk]
+
+class _Request:
+    __slots__ = ('key', 'items', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, key, items):
+        self.key      = key
+        self.items    = items
+        self.enqueued = time.monotonic()
+        self.done     = threading.Event()
+        self.result   = None
+        self.error    = None
+
+class MicroBatcher:
+    """Runs fn(key, items) for many callers at once.
+
+    Requests sharing a key (e.g. the same model bundle) are concatenated into
+    one call; fn must return a sequence or a dict of arrays aligned with
+    items. Requests that arrive while a batch runs always join the next one.
+    With window=None every call runs directly in the caller's thread.
+    observer(batch_size, queue_delays), if given, is called after every batch.
+    """
+
+    DELAY_SAMPLES = 2048
+
+    def __init__(self, fn, window=0.002, max_batch=256, observer=None):
+        self.fn        = fn
+        self.window    = window
+        self.max_batch = max_batch
+        self.observer  = observer
+        self._queue    = queue.SimpleQueue()
+        self._lock     = threading.Lock()
+        self._pid      = None
+        self._delays   = deque(maxlen=self.DELAY_SAMPLES)
+        self._sizes    = {}          # batch size bucket (power of two) -> count
+        self.batches   = 0
+        self.requests  = 0
+        self.items     = 0
+
+    @property
+    def enabled(self):
+        return self.window is not None
+
+    def submit(self, key, items):
+        """Run items through fn alongside any concurrent callers; blocks for the result."""
+        if not self.enabled or not items:
+            return self.fn(key, items)
+        self._ensure_thread()
+        request = _Request(key, items)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_thread(self):
+        # The dispatcher thread does not survive a fork (gunicorn preload)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._dispatch, name='micro-batcher',
+                                 daemon=True).start()
+                self._pid = os.getpid()
+
+    def _dispatch(self):
+        pending = self._queue
+        contended = False
+        while True:
+            first = pending.get()
+            batch, size = [first], len(first.items)
+            # A lone caller is not made to wait: the window only applies
+            # once the previous batch showed requests actually overlap
+            deadline = first.enqueued + self.window if contended else 0
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    request = pending.get(timeout=timeout) if timeout > 0 else pending.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.items)
+            contended = len(batch) > 1
+            self._run(batch)
+
+    def _run(self, batch):
+        started = time.monotonic()
+        groups = {}
+        for request in batch:
+            groups.setdefault(id(request.key), []).append(request)
+
+        for requests in groups.values():
+            try:
+                result = self.fn(requests[0].key, _concat(r.items for r in requests))
+                offset = 0
+                for r in requests:
+                    r.result = _slice(result, offset, offset + len(r.items))
+                    offset += len(r.items)
+            except Exception as e:
+                for r in requests:
+                    r.error = e
+            for r in requests:
+                r.done.set()
+            self._record(requests, started)
+
+    def _record(self, requests, started):
+        size = sum(len(r.items) for r in requests)
+        bucket = 1 << max(size - 1, 0).bit_length()
+        delays = [started - r.enqueued for r in requests]
+        with self._lock:
+            self.batches  += 1
+            self.requests += len(requests)
+            self.items    += size
+            self._sizes[bucket] = self._sizes.get(bucket, 0) + 1
+            self._delays.extend(delays)
+        if self.observer:
+            self.observer(size, delays)
+
+    def stats(self):
+        with self._lock:
+            delays = np.array(self._delays) * 1000
+            return {
+                'enabled': self.enabled,
+                'window_ms': self.window * 1000 if self.enabled else None,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'requests': self.requests,
+                'items': self.items,
+                'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'mean_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0.0,
+                'batch_sizes': {f'<={k}': v for k, v in sorted(self._sizes.items())},
+                'queue_delay_ms': {
+                    f'p{q}': round(float(np.percentile(delays, q)), 3) for q in (50, 95, 99)
+                } if len(delays) else {},
+            }
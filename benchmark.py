@@ -0,0 +1,201 @@
+"""
+Micro-benchmarks
+Times the classification hot path on synthetic tickets (see synthetic.py)
+and saves the results as JSON so runs from two commits can be diffed:
+
+    python benchmark.py                      # -> benchmark_results/<commit>.json
+    python benchmark.py --compare benchmark_results/<old commit>.json
+    python benchmark.py --only preprocess,analyze --kinds logs
+
+Every case reports ops/sec and p50/p95/p99 latency per call. The app runs
+against a throwaway database; the analyze cases use tickets it has never
+seen, so only the *_cached cases hit the prediction cache.
+"""
+
+import os, sys, json, time, platform, tempfile, argparse, subprocess
+from datetime import datetime
+
+import numpy as np
+
+from synthetic import KINDS, TicketGenerator
+
+RESULTS_DIR = 'benchmark_results'
+BATCH       = 64        # tickets per call in the *_batch cases
+THRESHOLD   = 10.0      # % drop in ops/sec reported as a regression
+
+def measure(fn, inputs, repeat=1, warmup=None):
+    """Call fn on every input (repeat times); per-call latency stats, None without inputs.
+
+    warmup inputs (default: the first 10) are called once, untimed.
+    """
+    if not inputs:
+        return None
+    for x in inputs[:10] if warmup is None else warmup:
+        fn(x)
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(repeat):
+        for x in inputs:
+            t0 = clock()
+            fn(x)
+            samples.append(clock() - t0)
+    lat = np.array(samples) / 1000.0            # microseconds
+    return {
+        'ops': len(samples),
+        'ops_per_sec': round(len(samples) / (lat.sum() / 1e6), 1),
+        'mean_us': round(float(lat.mean()), 2),
+        **{f'p{q}_us': round(float(np.percentile(lat, q)), 2) for q in (50, 95, 99)},
+    }
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def load_app():
+    """Import the app against a throwaway database, without background workers."""
+    os.environ['NEXUS_DB'] = os.path.join(tempfile.mkdtemp(prefix='smartdesk-bench-'), 'bench.db')
+    os.environ.setdefault('CLASSIFY_WORKER_THREADS', '0')
+    import app
+    return app
+
+def sklearn_heads(bundle):
+    """Per-head sklearn estimators from the version's ticket_model.pkl, if present."""
+    import joblib
+    path = os.path.join(bundle.path, 'ticket_model.pkl')
+    if not os.path.exists(path):
+        return None
+    model = joblib.load(path)
+    return model if hasattr(model, 'vectorizer') else None
+
+def cases(app, kind, count, repeat, seed):
+    """Yield (name, fn, inputs, repeat, warmup inputs or None) for one body kind."""
+    from preprocessing import preprocess
+
+    generator = TicketGenerator(seed)
+    tickets = generator.tickets(count, kind)
+    texts = [f"{t['subject']} {t['body']}" for t in tickets]
+    clean = [preprocess(t) for t in texts]
+    pairs = [(t['subject'], t['body']) for t in tickets]
+
+    yield 'preprocess', preprocess, texts, repeat, None
+    yield 'extract_entities', lambda p: app.extract_entities(*p), pairs, repeat, None
+    # Urgency keywords are found in the same pass as the entities
+    yield 'urgency_scan', lambda p: app.scan_ticket(*p)[1], pairs, repeat, None
+
+    bundle = app.registry.current
+    if bundle is not None:
+        model = bundle.model
+        if hasattr(model, 'transform'):
+            yield 'featurize', lambda t: model.transform([t]), clean, repeat, None
+        yield 'predict_proba', lambda t: model.predict_proba([t]), clean, repeat, None
+        # The last batch may be short (or the only one, below BATCH tickets)
+        batches = [clean[i:i + BATCH] for i in range(0, len(clean), BATCH)]
+        yield f'predict_proba_batch{BATCH}', model.predict_proba, batches, repeat, None
+
+        # The compiled engine scores all heads in one product; the sklearn
+        # artifact shows what each head costs on its own
+        sk = sklearn_heads(bundle)
+        if sk is not None:
+            X = [sk.transform([t]) for t in clean]
+            for head, clf in sk.heads.items():
+                yield f'predict_proba[{head}]', clf.predict_proba, X, repeat, None
+
+    client = app.app.test_client()
+    fresh = TicketGenerator(seed + 1).tickets(count, kind)
+    # Warm up on other tickets so the uncached case never hits the cache
+    warmup = TicketGenerator(seed + 2).tickets(10, kind)
+    analyze = lambda t: client.post('/api/analyze', json=t)
+    yield 'analyze', analyze, fresh, 1, warmup
+    yield 'analyze_cached', analyze, fresh, repeat, None
+
+def run(kinds, count, repeat, only=None, seed=0):
+    app = load_app()
+    results = {}
+    for kind in kinds:
+        for name, fn, inputs, times, warmup in cases(app, kind, count, repeat, seed):
+            if only and not name.startswith(only):
+                continue
+            stats = measure(fn, inputs, times, warmup)
+            if stats is None:
+                print(f"  {name + '/' + kind:<36} skipped: no inputs", file=sys.stderr)
+                continue
+            results[f'{name}/{kind}'] = stats
+            print(f"  {name + '/' + kind:<36} {stats['ops_per_sec']:>12,.1f} ops/s   "
+                  f"p50 {stats['p50_us']:>9,.1f}us  p95 {stats['p95_us']:>9,.1f}us  "
+                  f"p99 {stats['p99_us']:>9,.1f}us", file=sys.stderr)
+    bundle = app.registry.current
+    meta = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'model_version': bundle.version if bundle else None,
+        'count': count,
+        'repeat': repeat,
+        'seed': seed,
+    }
+    return {'meta': meta, 'results': results}
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """Print ops/sec and p99 changes per case; returns the regressed case names."""
+    regressed = []
+    print(f"\nvs {baseline['meta'].get('commit')}:")
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        speed = (new['ops_per_sec'] / old['ops_per_sec'] - 1) * 100
+        p99 = (new['p99_us'] / old['p99_us'] - 1) * 100 if old['p99_us'] else 0.0
+        flag = ''
+        if speed < -threshold:
+            flag = '  ❌ regression'
+            regressed.append(name)
+        elif speed > threshold:
+            flag = '  ✅ faster'
+        print(f"  {name:<36} {speed:+7.1f}% ops/s   p99 {p99:+7.1f}%{flag}")
+    return regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the classification hot path')
+    parser.add_argument('--kinds', default=','.join(KINDS), help='body kinds: short,typical,logs')
+    parser.add_argument('--count', type=int, default=500, help='synthetic tickets per kind')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the tickets for fast cases')
+    parser.add_argument('--only', help='comma-separated case name prefixes, e.g. preprocess,analyze')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help=f'results file (default: {RESULTS_DIR}/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='ops/sec drop (%%) that counts as a regression')
+    args = parser.parse_args(argv)
+
+    kinds = [k for k in args.kinds.split(',') if k]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        print(f"❌ Unknown kinds: {', '.join(sorted(unknown))}")
+        return 1
+    only = tuple(args.only.split(',')) if args.only else None     # name prefixes
+
+    report = run(kinds, args.count, args.repeat, only, args.seed)
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ {len(report['results'])} results saved to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(json.load(f), report, args.threshold)
+        if regressed:
+            print(f"❌ {len(regressed)} case(s) slower than {args.threshold:.0f}%")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Prediction Cache
+Bounded LRU/TTL cache of model outputs keyed on the preprocessed ticket text
+and the model version, with an optional SQLite table shared across workers.
+"""
+
+import os, json, time, hashlib, sqlite3, threading
+from collections import OrderedDict
+
+class PredictionCache:
+    """In-process LRU in front of an optional cross-worker SQLite table."""
+
+    PRUNE_EVERY = 500   # shared-table writes between expiry/size sweeps
+
+    def __init__(self, maxsize=10000, ttl=3600, db_path=None):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.db_path = db_path
+        self.version = None
+        self.hits    = 0
+        self.misses  = 0
+        self._data   = OrderedDict()   # key -> (expires_at, value)
+        self._lock   = threading.Lock()
+        self._local  = threading.local()
+        self._writes = 0
+        if db_path:
+            with self._shared() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS prediction_cache (
+                        key TEXT PRIMARY KEY,
+                        version TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )""")
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def key(self, clean_text, version):
+        return hashlib.sha1(f"{version}\0{clean_text}".encode()).hexdigest()
+
+    def _shared(self):
+        # Keyed on pid too: a preloaded gunicorn master must not hand its
+        # connection to forked workers
+        conn, pid = getattr(self._local, 'conn', (None, None))
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = (conn, os.getpid())
+        return conn
+
+    def get_many(self, clean_texts, version):
+        """Return {clean_text: cached value} for every text cached under version."""
+        if not self.enabled:
+            return {}
+        found, missing = {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for text in set(clean_texts):
+                k = self.key(text, version)
+                entry = self._data.get(k)
+                if entry and entry[0] > now:
+                    self._data.move_to_end(k)
+                    found[text] = entry[1]
+                else:
+                    if entry:
+                        del self._data[k]
+                    missing[k] = text
+
+        if missing and self.db_path:
+            try:
+                shared = self._shared_get(list(missing))
+            except sqlite3.Error as e:
+                print(f"Prediction cache read error: {e}")
+                shared = {}
+            if shared:
+                self._store({missing[k]: v for k, v in shared.items()}, version, now)
+                found.update({missing[k]: v for k, v in shared.items()})
+
+        with self._lock:
+            self.hits   += sum(1 for t in clean_texts if t in found)
+            self.misses += sum(1 for t in clean_texts if t not in found)
+        return found
+
+    def set_many(self, values, version):
+        """Cache {clean_text: value} produced by the given model version.
+
+        Writes for a version other than the active one (a request that
+        started before a model swap) are dropped.
+        """
+        if not self.enabled or not values or version != self.version:
+            return
+        self._store(values, version, time.monotonic())
+        if self.db_path:
+            try:
+                self._shared_set(values, version)
+            except sqlite3.Error as e:
+                print(f"Prediction cache write error: {e}")
+
+    def _store(self, values, version, now):
+        with self._lock:
+            for text, value in values.items():
+                k = self.key(text, version)
+                self._data[k] = (now + self.ttl, value)
+                self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _shared_get(self, keys):
+        conn = self._shared()
+        placeholders = ','.join('?' * len(keys))
+        rows = conn.execute(
+            f"""SELECT key, value FROM prediction_cache
+                WHERE key IN ({placeholders}) AND expires_at > ?""",
+            (*keys, time.time())
+        ).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def _shared_set(self, values, version):
+        expires_at = time.time() + self.ttl
+        with self._shared() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO prediction_cache VALUES (?,?,?,?)',
+                [(self.key(t, version), version, json.dumps(v), expires_at)
+                 for t, v in values.items()]
+            )
+            self._writes += len(values)
+            if self._writes >= self.PRUNE_EVERY:
+                self._writes = 0
+                conn.execute('DELETE FROM prediction_cache WHERE expires_at <= ?',
+                             (time.time(),))
+                conn.execute(
+                    """DELETE FROM prediction_cache WHERE key IN (
+                           SELECT key FROM prediction_cache
+                           ORDER BY expires_at DESC LIMIT -1 OFFSET ?)""",
+                    (self.maxsize,)
+                )
+
+    def set_version(self, version):
+        """Switch to a new model version, dropping everything cached for others."""
+        with self._lock:
+            self.version = version
+            self._data.clear()
+        if self.db_path:
+            try:
+                with self._shared() as conn:
+                    conn.execute('DELETE FROM prediction_cache WHERE version != ?',
+                                 (str(version),))
+            except sqlite3.Error as e:
+                print(f"Prediction cache invalidation error: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'shared': bool(self.db_path),
+                'version': self.version,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,90 @@
+"""
+Multi-head ticket classifier
+One TF-IDF vocabulary shared by the category, queue and priority heads.
+"""
+
+import os, json
+import joblib
+import numpy as np
+
+from inference import LinearEngine, score_heads
+
+HEADS = ('category', 'queue', 'priority')
+
+class MultiHeadClassifier:
+    """Vectorizes the text once and feeds the same sparse matrix to every head."""
+
+    def __init__(self, vectorizer, heads):
+        self.vectorizer = vectorizer
+        self.heads = dict(heads)
+
+    @property
+    def classes_(self):
+        return {name: clf.classes_ for name, clf in self.heads.items()}
+
+    def transform(self, texts):
+        return self.vectorizer.transform(texts)
+
+    def predict_proba(self, texts):
+        """Return {head: (n_texts, n_classes) probability array}."""
+        X = self.transform(texts)
+        return score_heads(self.heads, lambda clf: clf.predict_proba(X))
+
+class PipelineHeads:
+    """Adapter for the legacy layout of one full sklearn Pipeline per head."""
+
+    def __init__(self, pipelines):
+        self.heads = dict(pipelines)
+
+    @property
+    def classes_(self):
+        return {name: pipe.classes_ for name, pipe in self.heads.items()}
+
+    def predict_proba(self, texts):
+        return score_heads(self.heads, lambda pipe: pipe.predict_proba(texts))
+
+class BlendedModel:
+    """Weighted average of a base model and the online model learning corrections."""
+
+    def __init__(self, base, online, weight):
+        for head, classes in base.classes_.items():
+            if list(online.classes_[head]) != list(classes):
+                raise ValueError(f"{head}: online model classes differ from the base model")
+        self.base   = base
+        self.online = online
+        self.weight = weight
+
+    @property
+    def classes_(self):
+        return self.base.classes_
+
+    def predict_proba(self, texts):
+        base, online = self.base.predict_proba(texts), self.online.predict_proba(texts)
+        w = self.weight
+        # A head the online model could not score falls back to the base alone
+        return {head: (1 - w) * np.asarray(p) + w * np.asarray(online[head])
+                if head in online else np.asarray(p)
+                for head, p in base.items()}
+
+def load_classifier(model_dir='models'):
+    """Load the compiled engine, else the sklearn artifact, else per-head pickles.
+
+    Versions published by online_learning.py add online/compiled plus a
+    blend weight and load as a BlendedModel.
+    """
+    compiled_dir = os.path.join(model_dir, 'compiled')
+    if os.path.exists(os.path.join(compiled_dir, 'meta.json')):
+        engine = LinearEngine.load(compiled_dir)
+        blend_file = os.path.join(model_dir, 'online', 'blend.json')
+        if os.path.exists(blend_file):
+            with open(blend_file) as f:
+                weight = json.load(f)['weight']
+            online = LinearEngine.load(os.path.join(model_dir, 'online', 'compiled'))
+            return BlendedModel(engine, online, weight)
+        return engine
+    try:
+        return joblib.load(f'{model_dir}/ticket_model.pkl')
+    except FileNotFoundError:
+        return PipelineHeads({
+            name: joblib.load(f'{model_dir}/{name}_model.pkl') for name in HEADS
+        })
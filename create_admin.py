@@ -8,7 +8,7 @@ import sqlite3
 import getpass
 from werkzeug.security import generate_password_hash
 
-DB_PATH = 'nexus.db'
+from database import DB_PATH
 
 def create_admin():
     print("=" * 50)
@@ -0,0 +1,333 @@
+"""
+Database Layer
+SQLite connection pool tuned for concurrent request handling (WAL journal,
+busy timeout, mmap and page-cache pragmas) plus schema setup.
+"""
+
+import os, queue, sqlite3
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+DB_PATH   = os.environ.get('NEXUS_DB', 'nexus.db')
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+# Applied once when a connection is opened, not per request
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',        # readers never block the single writer
+    'PRAGMA synchronous=NORMAL',      # safe with WAL; fsync on checkpoint only
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-16000',       # 16 MB page cache per connection
+    'PRAGMA mmap_size=268435456',     # 256 MB memory-mapped reads
+    'PRAGMA temp_store=MEMORY',
+)
+
+class ConnectionPool:
+    """Per-process pool of configured connections, reused across requests."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._reset()
+
+    def _reset(self):
+        self._pid  = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        # Connections must not cross a fork (e.g. gunicorn preload)
+        if self._pid != os.getpid():
+            self._reset()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection outside a request (CLI, background threads)."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+pool = ConnectionPool(DB_PATH)
+
+def get_db():
+    """Connection for the current request, checked out from the pool once.
+
+    Outside an app context a fresh connection with the same pragmas is
+    returned and the caller owns it.
+    """
+    if not has_app_context():
+        return pool.connect()
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+# Sort key for "priority" ordering; indexes below are built on this exact
+# expression so ORDER BY can walk them instead of sorting.
+PRIORITY_RANK = "(CASE priority WHEN 'high' THEN 1 WHEN 'medium' THEN 2 ELSE 3 END)"
+
+# ── Stats counters ─────────────────────────────
+# ticket_counters holds COUNT(*) per (scope, dimension, value); user_id 0 is
+# the global scope. Triggers keep it in step with every write to tickets in
+# the same transaction, whichever code path performs the write.
+COUNTER_ALL_USERS = 0
+COUNTER_DIMS = {                   # dim -> expression over a tickets row
+    'total':    "''",
+    'status':   "COALESCE({r}.status, '')",
+    'category': "COALESCE({r}.category, '')",
+    'priority': "COALESCE({r}.priority, '')",
+    'day':      "COALESCE(date({r}.created_at), '')",
+}
+
+def _counter_values(row, delta):
+    return ',\n            '.join(
+        f"({scope}, '{dim}', {expr.format(r=row)}, {delta})"
+        for dim, expr in COUNTER_DIMS.items()
+        for scope in (COUNTER_ALL_USERS, f'{row}.user_id')
+    )
+
+def _counter_upsert(row, delta):
+    return f"""INSERT INTO ticket_counters (user_id, dim, value, cnt) VALUES
+        {_counter_values(row, delta)}
+        ON CONFLICT (user_id, dim, value) DO UPDATE SET cnt = cnt + excluded.cnt;"""
+
+COUNTER_REBUILD = ['DELETE FROM ticket_counters'] + [
+    f"""INSERT INTO ticket_counters (user_id, dim, value, cnt)
+        SELECT {scope}, '{dim}', {expr.format(r='tickets')}, COUNT(*)
+        FROM tickets GROUP BY 1, 3"""
+    for dim, expr in COUNTER_DIMS.items()
+    for scope in (COUNTER_ALL_USERS, 'user_id')
+]
+
+def rebuild_counters(conn):
+    """Recompute ticket_counters from the tickets table in one transaction."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for statement in COUNTER_REBUILD:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# ── Time-series rollups ────────────────────────
+# ticket_rollups counts tickets per (granularity, dimension, time bucket,
+# value), bucketed by creation time, for long-range analytics. Maintained by
+# triggers like ticket_counters; rebuild_stats.py backfills it.
+ROLLUP_GRANULARITIES = {
+    'day':  "COALESCE(date({r}.created_at), '')",
+    'hour': "COALESCE(strftime('%Y-%m-%d %H:00', {r}.created_at), '')",
+}
+ROLLUP_DIMS = {
+    'all':      "''",
+    'queue':    "COALESCE({r}.queue, '')",
+    'category': "COALESCE({r}.category, '')",
+    'priority': "COALESCE({r}.priority, '')",
+}
+
+def _rollup_upsert(row, delta):
+    values = ',\n            '.join(
+        f"('{gran}', '{dim}', {bucket.format(r=row)}, {expr.format(r=row)}, {delta})"
+        for gran, bucket in ROLLUP_GRANULARITIES.items()
+        for dim, expr in ROLLUP_DIMS.items()
+    )
+    return f"""INSERT INTO ticket_rollups (granularity, dim, bucket, value, cnt) VALUES
+            {values}
+        ON CONFLICT (granularity, dim, bucket, value) DO UPDATE SET cnt = cnt + excluded.cnt;"""
+
+ROLLUP_REBUILD = ['DELETE FROM ticket_rollups'] + [
+    f"""INSERT INTO ticket_rollups (granularity, dim, bucket, value, cnt)
+        SELECT '{gran}', '{dim}', {bucket.format(r='tickets')},
+               {expr.format(r='tickets')}, COUNT(*)
+        FROM tickets GROUP BY 3, 4"""
+    for gran, bucket in ROLLUP_GRANULARITIES.items()
+    for dim, expr in ROLLUP_DIMS.items()
+]
+
+def rebuild_rollups(conn):
+    """Recompute ticket_rollups from the tickets table in one transaction."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for statement in ROLLUP_REBUILD:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# Schema migrations: (user_version, statements). Append only; never edit a
+# migration that has shipped.
+MIGRATIONS = [
+    (1, [
+        """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            category TEXT,
+            queue TEXT,
+            priority TEXT,
+            status TEXT DEFAULT 'Pending',
+            confidence_category REAL DEFAULT 0,
+            confidence_priority REAL DEFAULT 0,
+            entities TEXT DEFAULT '{}',
+            admin_notes TEXT DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+    ]),
+    (2, [
+        # my_tickets(): per-user and admin listings, by date or by priority
+        "CREATE INDEX IF NOT EXISTS idx_tickets_user_created ON tickets(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at)",
+        f"CREATE INDEX IF NOT EXISTS idx_tickets_user_prio ON tickets(user_id, {PRIORITY_RANK})",
+        f"CREATE INDEX IF NOT EXISTS idx_tickets_prio ON tickets({PRIORITY_RANK})",
+    ]),
+    (3, [
+        """CREATE TABLE IF NOT EXISTS ticket_counters (
+            user_id INTEGER NOT NULL,
+            dim TEXT NOT NULL,
+            value TEXT NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, dim, value)
+        ) WITHOUT ROWID""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tickets_count_insert
+            AFTER INSERT ON tickets BEGIN
+            {_counter_upsert('NEW', 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tickets_count_delete
+            AFTER DELETE ON tickets BEGIN
+            {_counter_upsert('OLD', -1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tickets_count_update
+            AFTER UPDATE OF user_id, status, category, priority, created_at ON tickets
+            BEGIN
+            {_counter_upsert('OLD', -1)}
+            {_counter_upsert('NEW', 1)}
+        END""",
+        *COUNTER_REBUILD[1:],
+    ]),
+    (4, [
+        """CREATE TABLE IF NOT EXISTS ticket_rollups (
+            granularity TEXT NOT NULL,
+            dim TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            value TEXT NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dim, bucket, value)
+        ) WITHOUT ROWID""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tickets_rollup_insert
+            AFTER INSERT ON tickets BEGIN
+            {_rollup_upsert('NEW', 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tickets_rollup_delete
+            AFTER DELETE ON tickets BEGIN
+            {_rollup_upsert('OLD', -1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_tickets_rollup_update
+            AFTER UPDATE OF queue, category, priority, created_at ON tickets
+            BEGIN
+            {_rollup_upsert('OLD', -1)}
+            {_rollup_upsert('NEW', 1)}
+        END""",
+        *ROLLUP_REBUILD[1:],
+    ]),
+    (5, [
+        # my_tickets() status filter walks these in keyset order
+        "CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON tickets(status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_user_status_created ON tickets(user_id, status, created_at)",
+    ]),
+    (6, [
+        # jobs.py: queue of tickets awaiting background classification
+        """CREATE TABLE IF NOT EXISTS classification_jobs (
+            ticket_id INTEGER PRIMARY KEY,
+            enqueued_at REAL NOT NULL,
+            claimed_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        )""",
+    ]),
+    (7, [
+        # Admin label corrections; online_learning.py sets learned_in to the
+        # model version that absorbed each one. Rows outlive their ticket as
+        # an audit trail (pending ones of deleted tickets are skipped)
+        """CREATE TABLE IF NOT EXISTS ticket_corrections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_id INTEGER NOT NULL,
+            admin_id INTEGER NOT NULL,
+            field TEXT NOT NULL,
+            old_value TEXT,
+            new_value TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            learned_in TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_corrections_ticket ON ticket_corrections(ticket_id)",
+        """CREATE INDEX IF NOT EXISTS idx_corrections_pending ON ticket_corrections(id)
+            WHERE learned_in IS NULL""",
+    ]),
+]
+
+def migrate(conn):
+    """Apply pending migrations, each in its own write transaction.
+
+    BEGIN IMMEDIATE plus a re-read of user_version makes concurrent workers
+    starting at once apply every migration exactly once.
+    """
+    applied = []
+    for version, statements in MIGRATIONS:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] < version:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version={version}')
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+def init_db():
+    with pool.connection() as conn:
+        applied = migrate(conn)
+    if applied:
+        print(f"✅ Database migrated to schema v{applied[-1]}")
@@ -0,0 +1,104 @@
+"""
+Entity & Urgency Matcher
+Finds every IT entity class and urgency keyword in one pass over the ticket
+text using a single trie-shaped regex built from a dictionary file.
+"""
+
+import os, re, json
+
+DEFAULT_DICTIONARY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'config', 'entities.json')
+
+_WORD_CHAR = re.compile(r'\w')
+
+def _trie_regex(terms):
+    """Compile terms into one regex whose alternatives share common prefixes.
+
+    Optional suffixes are greedy, so at any position the longest term wins;
+    shorter terms ending inside it are recovered via EntityMatcher.prefixes.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = None
+
+    def build(node):
+        branches = [re.escape(ch) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return re.compile(build(trie))
+
+class EntityMatcher:
+    """Single-pass matcher over entity vocabularies plus urgency keywords.
+
+    Entity terms only match whole words, like the original \\b...\\b regexes.
+    Urgency keywords match anywhere in the text, like the original `in` scan.
+    """
+
+    URGENCY = 'urgency'
+
+    def __init__(self, entities, urgency):
+        self.entity_classes = list(entities)
+        self.urgency = [kw.lower() for kw in urgency]
+        self._urgency_rank = {kw: i for i, kw in enumerate(self.urgency)}
+
+        self.term_classes = {}
+        for cls, terms in entities.items():
+            for term in terms:
+                self.term_classes.setdefault(term.lower(), []).append(cls)
+        for kw in self.urgency:
+            self.term_classes.setdefault(kw, []).append(self.URGENCY)
+
+        terms = self.term_classes
+        self.pattern = _trie_regex(terms)
+        # term -> shorter terms that are prefixes of it, longest first
+        self.prefixes = {
+            term: [term[:i] for i in range(len(term) - 1, 0, -1) if term[:i] in terms]
+            for term in terms
+        }
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or DEFAULT_DICTIONARY) as f:
+            data = json.load(f)
+        return cls(data.get('entities', {}), data.get('urgency', []))
+
+    def scan(self, text):
+        """Return (entities, urgency_keyword) for already-lowercased text.
+
+        urgency_keyword is the earliest dictionary entry found, or None.
+        """
+        found = {}
+        urgency_kw = None
+        search = self.pattern.search
+        n = len(text)
+        pos = 0
+        while True:
+            m = search(text, pos)
+            if m is None:
+                break
+            start = m.start()
+            pos = start + 1
+            if start == m.end():
+                continue
+            at_word_start = start == 0 or not _WORD_CHAR.match(text, start - 1)
+            longest = m.group()
+            for term in (longest, *self.prefixes[longest]):
+                end = start + len(term)
+                whole_word = at_word_start and (end == n or not _WORD_CHAR.match(text, end))
+                for cls in self.term_classes[term]:
+                    if cls == self.URGENCY:
+                        if urgency_kw is None or \
+                           self._urgency_rank[term] < self._urgency_rank[urgency_kw]:
+                            urgency_kw = term
+                    elif whole_word:
+                        found.setdefault(cls, {}).setdefault(term, None)
+
+        entities = {cls: list(found[cls]) for cls in self.entity_classes if cls in found}
+        return entities, urgency_kw
@@ -0,0 +1,126 @@
+"""
+Ticket Export
+Streams tickets as NDJSON or CSV straight from a SQLite cursor, one batch of
+rows at a time, optionally gzip-compressed. Memory use does not grow with
+the number of rows. Shared by the admin export endpoint and this CLI:
+
+    python export_tickets.py --format csv --from 2024-01-01 --to 2024-03-31 -o q1.csv
+    python export_tickets.py --gzip > tickets.ndjson.gz
+"""
+
+import io, sys, csv, json, zlib, argparse
+from datetime import date, timedelta
+
+from database import pool
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_FIELDS  = ('id', 'user_id', 'user_email', 'subject', 'body', 'category',
+                  'queue', 'priority', 'status', 'confidence_category',
+                  'confidence_priority', 'entities', 'admin_notes',
+                  'created_at', 'updated_at')
+EXPORT_BATCH   = 1000
+
+def parse_range(start=None, end=None):
+    """Validate optional YYYY-MM-DD bounds (inclusive); raises ValueError."""
+    try:
+        start = date.fromisoformat(start) if start else None
+        end   = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise ValueError('from/to must be YYYY-MM-DD dates')
+    if start and end and start > end:
+        raise ValueError('from must not be after to')
+    return start, end
+
+def iter_rows(conn, start=None, end=None, batch=EXPORT_BATCH):
+    """Yield lists of ticket rows in (created_at, id) order, batch rows at a time."""
+    where, params = [], []
+    if start:
+        where.append('tickets.created_at >= ?')
+        params.append(start.isoformat())
+    if end:
+        where.append('tickets.created_at < ?')
+        params.append((end + timedelta(days=1)).isoformat())
+    columns = ', '.join('users.email AS user_email' if f == 'user_email' else f'tickets.{f}'
+                        for f in EXPORT_FIELDS)
+    cursor = conn.execute(
+        f"""SELECT {columns} FROM tickets
+            LEFT JOIN users ON users.id = tickets.user_id
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY tickets.created_at, tickets.id""",
+        params
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+def ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
+
+def csv_chunks(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def gzip_chunks(chunks):
+    """gzip a stream of str chunks incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(fmt='ndjson', start=None, end=None, compress=False):
+    """Generator of export chunks (str, or bytes when compress=True).
+
+    Borrows a pooled connection for the lifetime of the stream and returns
+    it when the generator finishes or is closed early.
+    """
+    encode = ndjson_chunks if fmt == 'ndjson' else csv_chunks
+    with pool.connection() as conn:
+        chunks = encode(iter_rows(conn, start, end))
+        yield from gzip_chunks(chunks) if compress else chunks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export tickets as NDJSON or CSV')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--from', dest='start', help='first day, YYYY-MM-DD')
+    parser.add_argument('--to', dest='end', help='last day, YYYY-MM-DD')
+    parser.add_argument('--gzip', action='store_true', help='gzip-compress the output')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = parse_range(args.start, args.end)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output:
+        out = open(args.output, 'wb') if args.gzip else open(args.output, 'w', newline='')
+    else:
+        out = sys.stdout.buffer if args.gzip else sys.stdout
+    try:
+        for chunk in export_stream(args.format, start, end, args.gzip):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"✅ Exported tickets to {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for SmartDesk
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+preload_app loads the models once in the master process before forking, so
+workers share the memory-mapped model arrays instead of each loading a copy.
+"""
+
+import os, multiprocessing
+
+bind        = os.environ.get('BIND', '0.0.0.0:5000')
+workers     = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads     = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = True
+timeout     = 60
+
+# METRICS_DIR holds per-worker metric snapshots that /metrics sums
+def on_starting(server):
+    import metrics
+    metrics.registry.reset_directory()
+
+def post_fork(server, worker):
+    # preload_app: whatever the master recorded would be summed once per worker
+    import metrics
+    metrics.registry.reset()
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.registry.flush()
@@ -0,0 +1,351 @@
+"""
+Compiled Linear Inference Engine
+Scores tickets with plain NumPy/SciPy arrays exported from the calibrated
+LinearSVC heads (or the SGD heads of out-of-core training), bypassing
+sklearn's per-estimator dispatch at predict time.
+
+The large arrays (vocabulary, idf, weights) are plain .npy files opened with
+mmap_mode='r', so every worker on a host shares the same physical pages.
+"""
+
+import os, re, json, tracemalloc
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit
+from sklearn.feature_extraction.text import HashingVectorizer
+
+ARTIFACT_FORMAT = 2
+
+def _weight(X, idf, sublinear_tf, norm):
+    """Apply TfidfTransformer's tf scaling, idf and l2 norm in place to raw counts."""
+    if sublinear_tf:
+        np.log(X.data, X.data)
+        X.data += 1
+    X.data *= idf[X.indices]
+    if norm == 'l2':
+        row_of = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=X.data ** 2,
+                                    minlength=X.shape[0]))
+        norms[norms == 0] = 1.0
+        X.data /= norms[row_of]
+    return X
+
+class TfidfFeaturizer:
+    """Reimplements TfidfVectorizer.transform over a sorted, memory-mapped vocabulary.
+
+    Terms are looked up with one np.searchsorted per batch instead of a
+    per-process Python dict, so the vocabulary costs no private memory.
+    """
+
+    def __init__(self, vocabulary, idf, ngram_range=(1, 1), token_pattern=r"(?u)\b\w\w+\b",
+                 lowercase=True, sublinear_tf=False, norm='l2'):
+        self.vocabulary = vocabulary          # sorted bytes array, index == column
+        self.idf = idf
+        self.min_n, self.max_n = ngram_range
+        self.token_re = re.compile(token_pattern)
+        self.lowercase = lowercase
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.max_term_bytes = vocabulary.dtype.itemsize
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer):
+        """Build a featurizer (and column permutation) from a fitted TfidfVectorizer."""
+        unsupported = (vectorizer.analyzer != 'word' or vectorizer.tokenizer
+                       or vectorizer.preprocessor or vectorizer.stop_words
+                       or vectorizer.binary or not vectorizer.use_idf
+                       or vectorizer.norm not in ('l2', None)
+                       or vectorizer.strip_accents)
+        if unsupported:
+            raise ValueError("TfidfVectorizer options not supported by TfidfFeaturizer")
+        names = vectorizer.get_feature_names_out()
+        encoded = np.array([n.encode('utf-8') for n in names])
+        order = np.argsort(encoded, kind='stable')
+        featurizer = cls(encoded[order], vectorizer.idf_[order],
+                         ngram_range=vectorizer.ngram_range,
+                         token_pattern=vectorizer.token_pattern,
+                         lowercase=vectorizer.lowercase,
+                         sublinear_tf=vectorizer.sublinear_tf,
+                         norm=vectorizer.norm)
+        return featurizer, order
+
+    def params(self):
+        return {
+            'ngram_range': [self.min_n, self.max_n],
+            'token_pattern': self.token_re.pattern,
+            'lowercase': self.lowercase,
+            'sublinear_tf': self.sublinear_tf,
+            'norm': self.norm,
+        }
+
+    def _ngrams(self, text):
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        grams = []
+        for n in range(self.min_n, self.max_n + 1):
+            if n == 1:
+                grams.extend(tokens)
+            else:
+                grams.extend(' '.join(tokens[i:i + n])
+                             for i in range(len(tokens) - n + 1))
+        return grams
+
+    def transform(self, texts):
+        texts = list(texts)
+        rows, grams = [], []
+        for row, text in enumerate(texts):
+            for gram in self._ngrams(text):
+                encoded = gram.encode('utf-8')
+                # Longer terms cannot be in the vocabulary and would be
+                # truncated (and possibly mis-matched) by the fixed-width array
+                if len(encoded) <= self.max_term_bytes:
+                    rows.append(row)
+                    grams.append(encoded)
+        n_features = len(self.vocabulary)
+        if grams:
+            keys = np.array(grams, dtype=self.vocabulary.dtype)
+            cols = np.searchsorted(self.vocabulary, keys)
+            cols[cols == n_features] = 0
+            hit = self.vocabulary[cols] == keys
+            rows, cols = np.asarray(rows)[hit], cols[hit]
+        else:
+            rows, cols = np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        X = sp.csr_matrix((np.ones(len(cols)), (rows, cols)),
+                          shape=(len(texts), n_features))
+        X.sum_duplicates()
+        return _weight(X, self.idf, self.sublinear_tf, self.norm)
+
+class HashingFeaturizer:
+    """Hashed n-gram counts with TF-IDF weighting; the only state is the idf array.
+
+    Used by out-of-core training, where no vocabulary is built: idf comes
+    from a document-frequency pass over the hashed columns.
+    """
+
+    def __init__(self, idf=None, n_features=2 ** 18, ngram_range=(1, 1),
+                 token_pattern=r"(?u)\b\w\w+\b", lowercase=True,
+                 sublinear_tf=False, norm='l2'):
+        self.idf = idf
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.hasher = HashingVectorizer(
+            n_features=n_features, ngram_range=self.ngram_range,
+            token_pattern=token_pattern, lowercase=lowercase,
+            norm=None, alternate_sign=False)
+
+    def params(self):
+        return {
+            'type': 'hashing',
+            'n_features': self.n_features,
+            'ngram_range': list(self.ngram_range),
+            'token_pattern': self.hasher.token_pattern,
+            'lowercase': self.hasher.lowercase,
+            'sublinear_tf': self.sublinear_tf,
+            'norm': self.norm,
+        }
+
+    def counts(self, texts):
+        """Raw hashed term counts (CSR, duplicates summed)."""
+        return self.hasher.transform(texts)
+
+    def transform(self, texts):
+        return _weight(self.counts(texts), self.idf, self.sublinear_tf, self.norm)
+
+def _fold_parts(calibrated):
+    """Yield (estimator, calibrators) for every fold of a CalibratedClassifierCV."""
+    for fold in calibrated.calibrated_classifiers_:
+        estimator = getattr(fold, 'estimator', None)
+        if estimator is None:
+            estimator = fold.base_estimator   # sklearn < 1.2
+        yield estimator, fold.calibrators
+
+def _write_engine(out_dir, featurizer, coef, intercepts, cal_a, cal_b,
+                  row_fold, row_class, heads, order=None):
+    os.makedirs(out_dir, exist_ok=True)
+    coef = np.array(coef, dtype=np.float32).T
+    if order is not None:
+        # Columns follow the sorted vocabulary so a term's index is its position
+        coef = coef[order]
+    np.save(os.path.join(out_dir, 'coef.npy'), np.ascontiguousarray(coef))
+    if isinstance(featurizer, TfidfFeaturizer):
+        np.save(os.path.join(out_dir, 'vocabulary.npy'), featurizer.vocabulary)
+    np.save(os.path.join(out_dir, 'idf.npy'), featurizer.idf)
+    np.save(os.path.join(out_dir, 'intercept.npy'), np.array(intercepts))
+    np.save(os.path.join(out_dir, 'calibration.npy'), np.array([cal_a, cal_b]))
+    np.save(os.path.join(out_dir, 'rows.npy'),
+            np.array([row_fold, row_class], dtype=np.int32))
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'format': ARTIFACT_FORMAT, 'featurizer': featurizer.params(),
+                   'heads': heads}, f, indent=2)
+
+def export_linear(featurizer, heads, out_dir):
+    """Export {head: fitted SGDClassifier(loss='log_loss')} over a HashingFeaturizer.
+
+    Logistic OvR probabilities are expit(w.x + b) normalized across classes,
+    which is the engine's calibrated-sigmoid scheme with a=-1, b=0 and a
+    single fold.
+    """
+    coefs, intercepts, row_class, meta = [], [], [], []
+    for name, clf in heads.items():
+        if getattr(clf, 'loss', None) != 'log_loss':
+            raise ValueError(f"{name}: only log-loss linear models can be exported")
+        classes = list(clf.classes_)
+        row_start = len(coefs)
+        # Binary models have a single decision row for classes[1]
+        class_idx = [1] if len(classes) == 2 else range(len(classes))
+        for k, c in enumerate(class_idx):
+            coefs.append(clf.coef_[k])
+            intercepts.append(clf.intercept_[k])
+            row_class.append(c)
+        meta.append({'name': name, 'classes': [str(c) for c in classes],
+                     'row_start': row_start, 'row_end': len(coefs), 'n_folds': 1})
+    n = len(coefs)
+    _write_engine(out_dir, featurizer, coefs, intercepts, [-1.0] * n, [0.0] * n,
+                  [0] * n, row_class, meta)
+
+def export_engine(model, out_dir):
+    """Fold a MultiHeadClassifier into arrays under out_dir.
+
+    Every (head, fold, class) sigmoid becomes one column of a single
+    (n_features, n_rows) weight matrix, so scoring all heads is one sparse
+    matmul followed by one vectorized sigmoid.
+    """
+    featurizer, order = TfidfFeaturizer.from_vectorizer(model.vectorizer)
+    coefs, intercepts, cal_a, cal_b, row_fold, row_class = [], [], [], [], [], []
+    heads = []
+
+    for name, calibrated in model.heads.items():
+        if getattr(calibrated, 'method', 'sigmoid') != 'sigmoid':
+            raise ValueError(f"{name}: only sigmoid calibration can be compiled")
+        classes = list(calibrated.classes_)
+        row_start = len(coefs)
+        n_folds = 0
+        for fold_idx, (estimator, calibrators) in enumerate(_fold_parts(calibrated)):
+            n_folds += 1
+            class_idx = [classes.index(c) for c in estimator.classes_]
+            if len(classes) == 2:
+                # Binary folds have a single decision column for classes[1]
+                class_idx = [1]
+            for k, calibrator in enumerate(calibrators):
+                coefs.append(estimator.coef_[k])
+                intercepts.append(estimator.intercept_[k])
+                cal_a.append(calibrator.a_)
+                cal_b.append(calibrator.b_)
+                row_fold.append(fold_idx)
+                row_class.append(class_idx[k])
+        heads.append({
+            'name': name,
+            'classes': [str(c) for c in classes],
+            'row_start': row_start,
+            'row_end': len(coefs),
+            'n_folds': n_folds,
+        })
+
+    _write_engine(out_dir, featurizer, coefs, intercepts, cal_a, cal_b,
+                  row_fold, row_class, heads, order)
+
+def score_heads(heads, score):
+    """{name: score(head)} for each head; a head that raises is logged and left
+    out so the others still answer (callers fall back to defaults for it)."""
+    out = {}
+    for name, head in heads.items():
+        try:
+            out[name] = score(head)
+        except Exception as e:
+            print(f"⚠️  {name} head failed: {e}")
+    return out
+
+class LinearEngine:
+    """Multi-head scorer over exported arrays; same interface as MultiHeadClassifier."""
+
+    def __init__(self, featurizer, coef, intercept, calibration, rows, heads):
+        self.featurizer = featurizer
+        self.coef       = coef
+        self.intercept  = intercept
+        self.cal_a, self.cal_b = calibration
+        self.row_fold, self.row_class = rows
+        self.head_meta  = heads
+        self.classes_   = {h['name']: np.array(h['classes']) for h in heads}
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Open an exported engine; large arrays are memory-mapped by default."""
+        def array(name, mmap=None):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap)
+
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        params = dict(meta.get('featurizer', {}))
+        if params.pop('type', 'tfidf') == 'hashing':
+            featurizer = HashingFeaturizer(array('idf', mmap_mode), **params)
+        elif meta.get('format', 1) >= 2:
+            featurizer = TfidfFeaturizer(array('vocabulary', mmap_mode),
+                                         array('idf', mmap_mode), **params)
+        else:
+            # Format 1 shipped a pickled TfidfVectorizer
+            featurizer = joblib.load(os.path.join(path, 'vectorizer.pkl'))
+        return cls(featurizer, array('coef', mmap_mode), array('intercept'),
+                   array('calibration'), array('rows'), meta['heads'])
+
+    def transform(self, texts):
+        return self.featurizer.transform(texts)
+
+    def predict_proba(self, texts):
+        """Return {head: (n_texts, n_classes) probability array}."""
+        return self.predict_proba_features(self.transform(texts))
+
+    def scores(self, X):
+        """Raw X @ coef. X is cast to the weights' float32 first: a float64 X
+        would make scipy upcast (copy) the whole weight matrix on every call."""
+        return np.asarray(X.astype(self.coef.dtype, copy=False) @ self.coef)
+
+    def check_scoring(self, texts):
+        """Raise unless scoring stays in the weights' dtype without copying them."""
+        X = self.transform(list(texts)[:8])
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            product = self.scores(X)
+            peak = tracemalloc.get_traced_memory()[1] - start
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        if product.dtype != self.coef.dtype:
+            raise TypeError(f"scores are {product.dtype}, weights are {self.coef.dtype}")
+        if peak >= self.coef.nbytes:
+            raise MemoryError(f"scoring allocated {peak} bytes: the {self.coef.nbytes}-byte "
+                              f"weight matrix is being copied")
+
+    def predict_proba_features(self, X):
+        scores = self.scores(X) + self.intercept
+        sig = expit(-(self.cal_a * scores + self.cal_b))
+        return score_heads({h['name']: h for h in self.head_meta},
+                           lambda head: self._head_proba(head, sig))
+
+    def _head_proba(self, head, sig):
+        """(n_texts, n_classes) probabilities of one head from the shared sigmoids."""
+        n = sig.shape[0]
+        lo, hi = head['row_start'], head['row_end']
+        n_classes = len(head['classes'])
+        proba = np.zeros((n, head['n_folds'], n_classes))
+        proba[:, self.row_fold[lo:hi], self.row_class[lo:hi]] = sig[:, lo:hi]
+
+        if n_classes == 2:
+            proba[:, :, 0] = 1.0 - proba[:, :, 1]
+        else:
+            denom = proba.sum(axis=2, keepdims=True)
+            proba = np.divide(proba, denom,
+                              out=np.full_like(proba, 1.0 / n_classes),
+                              where=denom != 0)
+
+        mean = proba.mean(axis=1)
+        mean[(1.0 < mean) & (mean <= 1.0 + 1e-5)] = 1.0
+        return mean
@@ -0,0 +1,213 @@
+"""
+Inference Server
+Runs the models in a pool of worker processes behind a local Unix socket so
+inference scales with cores independently of the web workers:
+
+    python inference_server.py --workers 4
+    INFERENCE_SOCKET=/tmp/smartdesk-inference.sock gunicorn -c gunicorn.conf.py app:app
+
+With INFERENCE_SOCKET set, app.py scores through InferenceClient instead of
+loading models itself. Requests name the model version they expect; workers
+load versions on demand (cheap for memory-mapped compiled models), so a hot
+swap in the web tier needs no coordination with the server.
+
+Messages are pickles, so both sides authenticate with a shared key:
+INFERENCE_AUTHKEY, or else a random key the server writes to <socket>.key
+(mode 0600) for clients run by the same user.
+"""
+
+import os, sys, argparse, secrets, threading
+from collections import OrderedDict
+from multiprocessing import Pool
+from multiprocessing.connection import AuthenticationError, Listener, Client
+
+from model_registry import ModelRegistry, LEGACY_VERSION
+
+DEFAULT_SOCKET  = '/tmp/smartdesk-inference.sock'
+REQUEST_TIMEOUT = 30.0
+KEEP_VERSIONS   = 2      # loaded versions kept per worker process
+
+def key_path(address):
+    return address + '.key'
+
+def load_authkey(address):
+    """INFERENCE_AUTHKEY, or the key the server wrote next to the socket."""
+    key = os.environ.get('INFERENCE_AUTHKEY')
+    if key:
+        return key.encode()
+    with open(key_path(address), 'rb') as f:
+        return f.read().strip()
+
+def create_authkey(address):
+    """INFERENCE_AUTHKEY, or a fresh random key written privately next to the socket."""
+    key = os.environ.get('INFERENCE_AUTHKEY')
+    if key:
+        return key.encode()
+    key = secrets.token_hex(32).encode()
+    path = key_path(address)
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+# ── Worker process side ────────────────────────
+_registry = None
+_bundles  = OrderedDict()
+
+def _init_worker(root):
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(root)
+
+def _bundle(version):
+    bundle = _bundles.get(version)
+    if bundle is None:
+        bundle = _registry.load_bundle(version)
+        _bundles[version] = bundle
+        while len(_bundles) > KEEP_VERSIONS:
+            _bundles.popitem(last=False)
+    _bundles.move_to_end(version)
+    return bundle
+
+def _classes(version, texts=None):
+    return dict(_bundle(version).model.classes_)
+
+def _predict(version, texts):
+    return _bundle(version).model.predict_proba(texts)
+
+WORKER_OPS = {'classes': _classes, 'predict': _predict}
+
+# ── Server ───────────────────────────────────
+class InferenceServer:
+    def __init__(self, address=DEFAULT_SOCKET, workers=None, root='models'):
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.root    = root
+        self.pool    = None
+
+    def start_pool(self):
+        # Load the active version before forking so workers share its pages
+        _init_worker(self.root)
+        try:
+            # Clients name the flat layout 'legacy'; preload under the same key
+            _bundle(_registry.active_version() or LEGACY_VERSION)
+        except Exception as e:
+            print(f"⚠️  Active model not preloaded: {e}")
+        self.pool = Pool(self.workers, initializer=_init_worker, initargs=(self.root,))
+
+    def serve_forever(self):
+        self.start_pool()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # Clients must prove they hold the key before anything is unpickled
+        listener = Listener(self.address, family='AF_UNIX',
+                            authkey=create_authkey(self.address))
+        os.chmod(self.address, 0o600)
+        print(f"✅ Inference server on {self.address} with {self.workers} workers")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    print("⚠️  Rejected an inference client with the wrong key")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            self.pool.terminate()
+
+    def handle(self, conn):
+        """Serve one client connection; each request runs on a pool worker."""
+        with conn:
+            while True:
+                try:
+                    op, version, texts = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op == 'ping':
+                    conn.send(('ok', None))
+                    continue
+                try:
+                    result = self.pool.apply(WORKER_OPS[op], (version, texts))
+                    conn.send(('ok', result))
+                except Exception as e:
+                    conn.send(('error', f"{type(e).__name__}: {e}"))
+
+# ── Client ───────────────────────────────────
+class InferenceError(RuntimeError):
+    pass
+
+class InferenceClient:
+    """Thread-safe client; keeps one connection per thread and process."""
+
+    def __init__(self, address=DEFAULT_SOCKET, timeout=REQUEST_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._authkey = None
+        self._local  = threading.local()
+
+    def _connection(self):
+        conn, pid = getattr(self._local, 'conn', (None, None))
+        if conn is None or pid != os.getpid():
+            if self._authkey is None:
+                self._authkey = load_authkey(self.address)
+            conn = Client(self.address, family='AF_UNIX', authkey=self._authkey)
+            self._local.conn = (conn, os.getpid())
+        return conn
+
+    def _drop(self):
+        conn, _ = getattr(self._local, 'conn', (None, None))
+        self._local.conn = (None, None)
+        if conn is not None:
+            conn.close()
+
+    def call(self, op, version=None, texts=None):
+        for attempt in (1, 2):        # one reconnect if the server restarted
+            try:
+                conn = self._connection()
+                conn.send((op, version, texts))
+                if not conn.poll(self.timeout):
+                    self._drop()
+                    raise InferenceError(f"inference server timed out after {self.timeout}s")
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError, AuthenticationError) as e:
+                self._drop()
+                self._authkey = None      # a restarted server writes a new key
+                if attempt == 2:
+                    raise InferenceError(f"inference server unavailable: {e}")
+        if status != 'ok':
+            raise InferenceError(result)
+        return result
+
+    def remote_model(self, version, path=None):
+        """ModelRegistry loader: a model proxy scored by the server."""
+        return RemoteModel(self, version)
+
+class RemoteModel:
+    """Stands in for MultiHeadClassifier; predictions run in the server."""
+
+    def __init__(self, client, version):
+        self.client   = client
+        self.version  = version
+        self.classes_ = client.call('classes', version)
+
+    def predict_proba(self, texts):
+        return self.client.call('predict', self.version, list(texts))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve model inference over a Unix socket')
+    parser.add_argument('--socket', default=os.environ.get('INFERENCE_SOCKET', DEFAULT_SOCKET))
+    parser.add_argument('--workers', type=int, help='model processes (default: CPU count)')
+    parser.add_argument('--models', default='models')
+    args = parser.parse_args(argv)
+    try:
+        InferenceServer(args.socket, args.workers, args.models).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
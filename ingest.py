@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Bulk Ticket Ingestion
+Streams tickets from a CSV or JSONL file, classifies them in chunks across a
+process pool (model labels, entities and urgency rules exactly as the API
+does) and inserts them with executemany in large transactions.
+
+    python ingest.py archive.csv --user admin@example.com
+    python ingest.py export.jsonl --user admin@example.com --workers 8
+
+Each record needs a subject and a body; created_at, when present, is kept.
+"""
+
+import os, sys, csv, json, time, argparse
+from itertools import islice
+from multiprocessing import Pool
+
+# Importing the app loads the models and entity dictionary once; forked
+# workers share them instead of loading their own copies.
+from app import classify_tickets
+from database import pool
+
+CHUNK_SIZE   = 2000     # tickets per worker task
+COMMIT_EVERY = 20000    # tickets per write transaction
+
+INSERT_SQL = """INSERT INTO tickets
+    (user_id, subject, body, category, queue, priority,
+     confidence_category, confidence_priority, entities, created_at)
+    VALUES (?,?,?,?,?,?,?,?,?, COALESCE(?, CURRENT_TIMESTAMP))"""
+
+def read_records(path, fmt=None):
+    """Yield one dict per record without loading the whole file."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def chunked(records, size, subject_field='subject', body_field='body'):
+    """Group records into lists of (subject, body, created_at), skipping empty ones.
+
+    Yields (chunk, skipped) where skipped counts records dropped for a
+    missing subject or body.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        chunk = []
+        for record in batch:
+            subject = str(record.get(subject_field) or '').strip()
+            body    = str(record.get(body_field) or '').strip()
+            if subject and body:
+                chunk.append((subject, body, record.get('created_at') or None))
+        yield chunk, len(batch) - len(chunk)
+
+def classify_chunk(chunk):
+    """Worker task: classify one chunk and return rows ready for INSERT_SQL."""
+    results = classify_tickets([(subject, body) for subject, body, _ in chunk])
+    return [
+        (subject, body, r['category'], r['queue'], r['priority'],
+         r['confidence_category'], r['confidence_priority'],
+         json.dumps(r['entities']), created_at)
+        for (subject, body, created_at), r in zip(chunk, results)
+    ]
+
+def lookup_user(conn, email):
+    row = conn.execute('SELECT id FROM users WHERE email = ?',
+                       (email.strip().lower(),)).fetchone()
+    return row['id'] if row else None
+
+def ingest(path, user_id, fmt=None, workers=None, chunk_size=CHUNK_SIZE,
+           commit_every=COMMIT_EVERY, subject_field='subject', body_field='body'):
+    """Ingest a file; returns (inserted, skipped, seconds)."""
+    chunks = chunked(read_records(path, fmt), chunk_size, subject_field, body_field)
+    skipped = 0
+
+    def tasks():
+        nonlocal skipped
+        for chunk, dropped in chunks:
+            skipped += dropped
+            if chunk:
+                yield chunk
+
+    workers = workers or os.cpu_count() or 1
+    procs = Pool(workers) if workers > 1 else None
+    classified = procs.imap(classify_chunk, tasks()) if procs else map(classify_chunk, tasks())
+
+    inserted = pending = 0
+    started = time.perf_counter()
+    try:
+        with pool.connection() as conn:
+            for rows in classified:
+                conn.executemany(INSERT_SQL, [(user_id, *row) for row in rows])
+                pending  += len(rows)
+                inserted += len(rows)
+                if pending >= commit_every:
+                    conn.commit()
+                    pending = 0
+                    elapsed = time.perf_counter() - started
+                    print(f"  {inserted:,} tickets  {inserted / elapsed:,.0f} rows/sec",
+                          file=sys.stderr)
+            conn.commit()
+    finally:
+        if procs:
+            procs.close()
+            procs.join()
+    return inserted, skipped, time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-ingest tickets from CSV or JSONL')
+    parser.add_argument('path')
+    parser.add_argument('--user', required=True, help='email of the account that owns the tickets')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='default: from the file extension')
+    parser.add_argument('--workers', type=int, help='classifier processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--commit-every', type=int, default=COMMIT_EVERY)
+    parser.add_argument('--subject-field', default='subject')
+    parser.add_argument('--body-field', default='body')
+    args = parser.parse_args(argv)
+
+    with pool.connection() as conn:
+        user_id = lookup_user(conn, args.user)
+    if user_id is None:
+        print(f"❌ No account with email {args.user}")
+        return 1
+
+    try:
+        inserted, skipped, seconds = ingest(
+            args.path, user_id, args.format, args.workers, args.chunk_size,
+            args.commit_every, args.subject_field, args.body_field)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"❌ Ingestion failed: {e}")
+        return 1
+
+    rate = inserted / seconds if seconds else 0.0
+    print(f"✅ Ingested {inserted:,} tickets in {seconds:.1f}s ({rate:,.0f} rows/sec)")
+    if skipped:
+        print(f"⚠️  Skipped {skipped:,} records without a subject or body")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
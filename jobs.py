@@ -0,0 +1,226 @@
+"""
+Classification Jobs
+Background classification for tickets submitted asynchronously. Tickets are
+saved with status 'Classifying' plus a row in classification_jobs; workers
+claim pending jobs in batches, run them through the models and fill in the
+labels. The job table lives in the main database, so queued work survives
+restarts, and claims carry a lease so a crashed worker's jobs are retried.
+
+Web processes run a worker thread by default (CLASSIFY_WORKER_THREADS=0 to
+disable). A standalone worker can drain the queue too:
+
+    python jobs.py --threads 2
+"""
+
+import os, sys, json, time, threading, argparse
+
+from database import pool
+from metrics import stage
+
+CLASSIFYING_STATUS = 'Classifying'
+BATCH_SIZE    = 64      # jobs claimed per model call
+POLL_INTERVAL = 0.25    # seconds between queue checks when idle
+LEASE_SECONDS = 60      # a claim older than this is considered abandoned
+MAX_ATTEMPTS  = 3
+
+UPDATE_TICKET_SQL = f"""UPDATE tickets SET
+    category=?, queue=?, priority=?, confidence_category=?, confidence_priority=?,
+    entities=?, updated_at=CURRENT_TIMESTAMP,
+    status = CASE status WHEN '{CLASSIFYING_STATUS}' THEN 'Pending' ELSE status END
+    WHERE id=?"""
+
+def enqueue(conn, ticket_ids):
+    """Queue already-inserted tickets; runs inside the caller's transaction."""
+    now = time.time()
+    conn.executemany(
+        'INSERT OR IGNORE INTO classification_jobs (ticket_id, enqueued_at) VALUES (?, ?)',
+        [(tid, now) for tid in ticket_ids]
+    )
+
+class ClassificationWorker:
+    """Pulls batches off classification_jobs and writes labels back.
+
+    classify takes a list of (subject, body) and returns result dicts as
+    app.classify_tickets() does.
+    """
+
+    def __init__(self, classify, threads=1, batch_size=BATCH_SIZE,
+                 poll_interval=POLL_INTERVAL, lease=LEASE_SECONDS):
+        self.classify      = classify
+        self.threads       = threads
+        self.batch_size    = batch_size
+        self.poll_interval = poll_interval
+        self.lease         = lease
+        self.processed     = 0
+        self.failed        = 0
+        self._wake    = threading.Event()
+        self._stop    = threading.Event()
+        self._lock    = threading.Lock()
+        self._started_pid = None
+
+    def ensure_started(self):
+        """Start the worker threads once per process (cheap to call per request)."""
+        if self.threads <= 0 or self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._stop.clear()
+            for i in range(self.threads):
+                threading.Thread(target=self.run, name=f'classify-{i}', daemon=True).start()
+
+    def notify(self):
+        """Wake an idle worker in this process; others find the job on their next poll."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                busy = self.process_batch()
+            except Exception as e:
+                print(f"⚠️  Classification worker error: {e}")
+                busy = 0
+            if not busy:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def claim(self, conn):
+        """Atomically lease up to batch_size jobs; returns their ticket ids."""
+        now = time.time()
+        # A plain read first: idle polls must not take the write lock that
+        # request inserts and other writers are waiting for
+        if conn.execute(
+            """SELECT 1 FROM classification_jobs
+               WHERE claimed_at IS NULL OR claimed_at < ? LIMIT 1""",
+            (now - self.lease,)
+        ).fetchone() is None:
+            return []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Leases that expired on their last attempt (worker died, or the
+            # failure could not be recorded) are not retried again
+            abandoned = [row[0] for row in conn.execute(
+                """SELECT ticket_id FROM classification_jobs
+                   WHERE claimed_at < ? AND attempts >= ?""",
+                (now - self.lease, MAX_ATTEMPTS)
+            )]
+            if abandoned:
+                self._give_up(conn, abandoned, 'lease expired on the last attempt')
+            ids = [row[0] for row in conn.execute(
+                """SELECT ticket_id FROM classification_jobs
+                   WHERE (claimed_at IS NULL OR claimed_at < ?) AND attempts < ?
+                   ORDER BY ticket_id LIMIT ?""",
+                (now - self.lease, MAX_ATTEMPTS, self.batch_size)
+            )]
+            conn.executemany(
+                'UPDATE classification_jobs SET claimed_at=?, attempts=attempts+1 WHERE ticket_id=?',
+                [(now, tid) for tid in ids]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return ids
+
+    def process_batch(self):
+        """Classify one batch of queued tickets; returns how many jobs were taken."""
+        with pool.connection() as conn:
+            ids = self.claim(conn)
+            if not ids:
+                return 0
+            placeholders = ','.join('?' * len(ids))
+            tickets = conn.execute(
+                f'SELECT id, subject, body FROM tickets WHERE id IN ({placeholders})', ids
+            ).fetchall()
+
+            try:
+                results = self.classify([(t['subject'], t['body']) for t in tickets])
+            except Exception as e:
+                self._failed(conn, ids, e)
+                return len(ids)
+
+            # Tickets deleted while queued simply drop out here
+            try:
+                with stage('db_job_update'):
+                    conn.executemany(UPDATE_TICKET_SQL, [
+                        (r['category'], r['queue'], r['priority'], r['confidence_category'],
+                         r['confidence_priority'], json.dumps(r['entities']), t['id'])
+                        for t, r in zip(tickets, results)
+                    ])
+                    conn.execute(f'DELETE FROM classification_jobs WHERE ticket_id IN ({placeholders})', ids)
+                    conn.commit()
+            except Exception as e:
+                conn.rollback()
+                self._failed(conn, ids, e)
+                return len(ids)
+        with self._lock:
+            self.processed += len(ids)
+        return len(ids)
+
+    def _failed(self, conn, ids, error):
+        """Release the claims for a retry, giving up after MAX_ATTEMPTS."""
+        placeholders = ','.join('?' * len(ids))
+        exhausted = [row[0] for row in conn.execute(
+            f"""SELECT ticket_id FROM classification_jobs
+                WHERE ticket_id IN ({placeholders}) AND attempts >= ?""",
+            (*ids, MAX_ATTEMPTS)
+        )]
+        conn.execute(
+            f"""UPDATE classification_jobs SET claimed_at=NULL, last_error=?
+                WHERE ticket_id IN ({placeholders})""",
+            (str(error), *ids)
+        )
+        if exhausted:
+            self._give_up(conn, exhausted, error)
+        conn.commit()
+        with self._lock:
+            self.failed += len(ids)
+
+    def _give_up(self, conn, ids, error):
+        """Drop the jobs, leaving the tickets unlabelled but visible in the normal workflow."""
+        marks = ','.join('?' * len(ids))
+        conn.execute(
+            f"""UPDATE tickets SET status='Pending', updated_at=CURRENT_TIMESTAMP
+                WHERE id IN ({marks}) AND status='{CLASSIFYING_STATUS}'""",
+            ids
+        )
+        conn.execute(f'DELETE FROM classification_jobs WHERE ticket_id IN ({marks})', ids)
+        print(f"❌ Gave up classifying {len(ids)} tickets: {error}")
+
+    def stats(self):
+        with pool.connection() as conn:
+            queued, oldest = conn.execute(
+                'SELECT COUNT(*), MIN(enqueued_at) FROM classification_jobs').fetchone()
+        with self._lock:
+            return {
+                'threads': self.threads if self._started_pid == os.getpid() else 0,
+                'queued': queued,
+                'oldest_age': round(time.time() - oldest, 3) if oldest else None,
+                'processed': self.processed,
+                'failed': self.failed,
+            }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a standalone classification worker')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from app import classify_tickets
+    worker = ClassificationWorker(classify_tickets, args.threads, args.batch_size)
+    worker.ensure_started()
+    print(f"✅ Classification worker running with {args.threads} thread(s); CTRL+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
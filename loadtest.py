@@ -0,0 +1,439 @@
+"""
+Load Test
+Seeds the database with synthetic users and tickets, then replays a mix of
+API traffic against a running instance from N concurrent virtual users and
+reports throughput, errors and latency percentiles per endpoint.
+
+    python loadtest.py seed --tickets 200000 --users 100
+    python loadtest.py run --url http://127.0.0.1:5000 --concurrency 32 --duration 60
+    python loadtest.py run --serve --workers 4 --concurrency 32    # start gunicorn too
+    python loadtest.py run --trace trace.jsonl --concurrency 16
+
+Seeding writes to NEXUS_DB (default nexus.db) directly, so point it at a copy
+of production data or a scratch file, never a live database. Trace lines
+look like {"method": "PATCH", "path": "/api/tickets/{ticket_id}",
+"json": {"status": "Resolved"}}; {ticket_id} becomes one of the virtual
+user's own tickets. Without --trace the built-in profile (MIX) is used.
+
+SQLite lock errors do not reach clients as such (they surface as 500s), so
+they are counted from the server log: captured automatically with --serve,
+or read from --server-log.
+"""
+
+import os, re, sys, json, time, random, socket, argparse, threading, subprocess
+import http.client
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from database import pool, init_db
+from entities import EntityMatcher
+from synthetic import TicketGenerator
+
+PASSWORD      = 'loadtest-password'
+ADMIN_EMAIL   = 'loadtest-admin@example.com'
+USER_EMAIL    = 'loadtest-{}@example.com'
+STATUSES      = ('Pending', 'In Progress', 'Resolved', 'Closed')
+SEED_DAYS     = 180
+COMMIT_EVERY  = 20000
+LOCK_ERRORS   = re.compile(r'database is locked|database table is locked|SQLITE_BUSY')
+
+# endpoint -> weight in the synthetic profile
+MIX = {
+    'analyze': 30,
+    'predict': 20,
+    'tickets': 25,
+    'stats':   10,
+    'patch':   15,
+}
+
+INSERT_SQL = """INSERT INTO tickets
+    (user_id, subject, body, category, queue, priority, status,
+     confidence_category, confidence_priority, entities, created_at, updated_at)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+# ── Seeding ──────────────────────────────────
+def model_labels(root='models'):
+    """Label values from the active model's stats.json, so seeded data looks predicted."""
+    defaults = {
+        'categories': ['Incident', 'Request', 'Problem', 'Change'],
+        'queues': ['Technical Support', 'IT Support', 'Billing and Payments', 'Customer Service'],
+        'priorities': ['high', 'medium', 'low'],
+    }
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            version = f.read().strip()
+        with open(os.path.join(root, version, 'stats.json')) as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return defaults
+    return {key: list(stats.get(key) or values) for key, values in defaults.items()}
+
+def seed_users(conn, users, admins=1):
+    """Create (or reuse) the load-test accounts; returns their ids."""
+    password = generate_password_hash(PASSWORD)      # hashing is slow; share one
+    accounts = [('Load Test Admin', ADMIN_EMAIL if i == 0 else f'loadtest-admin-{i}@example.com', 'admin')
+                for i in range(admins)]
+    accounts += [(f'Load Test {i}', USER_EMAIL.format(i), 'user') for i in range(users)]
+    conn.executemany(
+        'INSERT OR IGNORE INTO users (name, email, password, role) VALUES (?,?,?,?)',
+        [(name, email, password, role) for name, email, role in accounts]
+    )
+    conn.commit()
+    marks = ','.join('?' * len(accounts))
+    return [row[0] for row in conn.execute(
+        f'SELECT id FROM users WHERE email IN ({marks}) ORDER BY id',
+        [email for _, email, _ in accounts])]
+
+def seed(tickets, users, kind='typical', seed=0):
+    """Insert synthetic tickets spread over users and the last SEED_DAYS days."""
+    init_db()
+    rng = random.Random(seed)
+    labels = model_labels()
+    matcher = EntityMatcher.from_file(os.environ.get('ENTITY_DICTIONARY'))
+    generator = TicketGenerator(seed)
+    now = datetime.now()
+    started = time.perf_counter()
+
+    with pool.connection() as conn:
+        user_ids = seed_users(conn, users)
+        rows = []
+        for n in range(1, tickets + 1):
+            t = generator.ticket(kind)
+            created = now - timedelta(seconds=rng.randrange(SEED_DAYS * 86400))
+            entities, _ = matcher.scan(f"{t['subject']} {t['body']}".lower())
+            stamp = created.strftime('%Y-%m-%d %H:%M:%S')
+            rows.append((
+                rng.choice(user_ids), t['subject'], t['body'],
+                rng.choice(labels['categories']), rng.choice(labels['queues']),
+                rng.choice(labels['priorities']), rng.choice(STATUSES),
+                round(rng.uniform(0.4, 1.0), 3), round(rng.uniform(0.4, 1.0), 3),
+                json.dumps(entities), stamp, stamp,
+            ))
+            if len(rows) >= COMMIT_EVERY or n == tickets:
+                conn.executemany(INSERT_SQL, rows)
+                conn.commit()
+                rows = []
+                elapsed = time.perf_counter() - started
+                print(f"  {n:,} tickets  {n / elapsed:,.0f} rows/sec", file=sys.stderr)
+    return time.perf_counter() - started
+
+# ── Traffic ──────────────────────────────────
+class Stats:
+    """Latencies and errors per endpoint, shared by all virtual users."""
+
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors    = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, error=None):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint][error] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, lat in sorted(self.latencies.items()):
+            ms = np.array(lat) * 1000
+            errors = dict(self.errors.get(endpoint, {}))
+            endpoints[endpoint] = {
+                'requests': len(lat),
+                'rps': round(len(lat) / elapsed, 2),
+                'errors': sum(errors.values()),
+                'error_rate': round(sum(errors.values()) / len(lat), 4),
+                'error_kinds': errors,
+                **{f'p{q}_ms': round(float(np.percentile(ms, q)), 2) for q in (50, 95, 99)},
+                'max_ms': round(float(ms.max()), 2),
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(e['errors'] for e in endpoints.values())
+        return {
+            'duration_s': round(elapsed, 2),
+            'requests': total,
+            'rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'endpoints': endpoints,
+        }
+
+def endpoint_name(method, path):
+    """Group '/api/tickets/123?x=1' and friends under one row."""
+    path = re.sub(r'/\d+(?=/|$)', '/<id>', path.split('?')[0])
+    return f"{method} {path}"
+
+class VirtualUser(threading.Thread):
+    """One logged-in user on a keep-alive connection, issuing requests until the deadline."""
+
+    def __init__(self, host, port, email, stats, deadline, next_request,
+                 think=0.0, timeout=30.0, seed=0):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.email    = email
+        self.stats    = stats
+        self.deadline = deadline
+        self.next_request = next_request
+        self.think    = think
+        self.timeout  = timeout
+        self.rng      = random.Random(seed)
+        self.tickets  = TicketGenerator(seed)
+        self.cookie   = None
+        self.conn     = None
+        self.own_ids  = []
+
+    def request(self, method, path, body=None, record=True):
+        """Send one request; returns (status, parsed JSON or None)."""
+        headers = {'Content-Type': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        payload = json.dumps(body) if body is not None else None
+        endpoint = endpoint_name(method, path)
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as e:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            if record:
+                self.stats.record(endpoint, time.perf_counter() - started, type(e).__name__)
+            return None, None
+        elapsed = time.perf_counter() - started
+
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+        if record:
+            error = None
+            if status >= 400:
+                error = 'sqlite_locked' if LOCK_ERRORS.search(raw.decode('utf-8', 'replace')) \
+                    else f'HTTP {status}'
+            self.stats.record(endpoint, elapsed, error)
+        return status, data
+
+    def login(self):
+        status, _ = self.request('POST', '/api/login', {'email': self.email, 'password': PASSWORD})
+        if status != 200:
+            return False
+        # Own ticket ids for PATCH traffic
+        _, data = self.request('GET', '/api/tickets?limit=200&fields=id', record=False)
+        self.own_ids = [t['id'] for t in (data or {}).get('tickets', [])]
+        return True
+
+    def synthetic_request(self):
+        """Pick the next call from MIX; returns (method, path, json)."""
+        action = self.rng.choices(list(MIX), list(MIX.values()))[0]
+        if action == 'patch' and not self.own_ids:
+            action = 'predict'
+        if action == 'analyze':
+            return 'POST', '/api/analyze', self.tickets.ticket('mixed')
+        if action == 'predict':
+            return 'POST', '/api/predict', self.tickets.ticket('mixed')
+        if action == 'tickets':
+            query = f"?limit={self.rng.choice((20, 50, 100))}"
+            if self.rng.random() < 0.3:
+                query += f"&status={self.rng.choice(STATUSES).replace(' ', '%20')}"
+            return 'GET', '/api/tickets' + query, None
+        if action == 'stats':
+            return 'GET', '/api/stats', None
+        return 'PATCH', f'/api/tickets/{self.rng.choice(self.own_ids)}', \
+            {'status': self.rng.choice(STATUSES)}
+
+    def run(self):
+        if not self.login():
+            return
+        while time.monotonic() < self.deadline:
+            spec = self.next_request(self) if self.next_request else self.synthetic_request()
+            if spec is None:
+                return
+            method, path, body = spec
+            if '{ticket_id}' in path:
+                if not self.own_ids:
+                    continue
+                path = path.replace('{ticket_id}', str(self.rng.choice(self.own_ids)))
+            status, data = self.request(method, path, body)
+            if status == 200 and path.startswith('/api/predict') and isinstance(data, dict) \
+                    and data.get('ticket_id'):
+                self.own_ids.append(data['ticket_id'])
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+        if self.conn is not None:
+            self.conn.close()
+
+def trace_reader(path, loop=True):
+    """Hand trace lines to virtual users in file order, looping if asked."""
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if not entries:
+        raise ValueError(f"{path} has no requests")
+    lock = threading.Lock()
+    position = 0
+
+    def next_request(user):
+        nonlocal position
+        with lock:
+            if position >= len(entries):
+                if not loop:
+                    return None
+                position = 0
+            entry = entries[position]
+            position += 1
+        return entry.get('method', 'GET').upper(), entry['path'], entry.get('json')
+    return next_request
+
+def run(url, concurrency, duration, users=100, trace=None, loop=True, think=0.0,
+        admin_share=0.1, ramp=0.0):
+    """Drive traffic for duration seconds; returns the report dict."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    next_request = trace_reader(trace, loop) if trace else None
+    stats = Stats()
+
+    deadline = time.monotonic() + ramp + duration
+    threads = []
+    for i in range(concurrency):
+        email = ADMIN_EMAIL if random.Random(i).random() < admin_share \
+            else USER_EMAIL.format(i % users)
+        threads.append(VirtualUser(host, port, email, stats, deadline, next_request,
+                                   think, seed=i))
+    started = time.monotonic()
+    for i, thread in enumerate(threads):
+        thread.start()
+        if ramp:
+            time.sleep(ramp / concurrency)
+    for thread in threads:
+        thread.join()
+    return stats.report(time.monotonic() - started)
+
+# ── Local server ─────────────────────────────
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workers, log_path, port=None):
+    """Start gunicorn on localhost against the same database; returns (process, url)."""
+    port = port or free_port()
+    env = dict(os.environ, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers))
+    log = open(log_path, 'w')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                               env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}; see {log_path}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/me')
+            conn.getresponse().read()
+            conn.close()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"server did not start within 60s; see {log_path}")
+
+def count_lock_errors(log_path, offset=0):
+    try:
+        with open(log_path, errors='replace') as f:
+            f.seek(offset)
+            return len(LOCK_ERRORS.findall(f.read()))
+    except OSError:
+        return None
+
+def print_report(report):
+    print(f"\n{'endpoint':<28} {'reqs':>8} {'rps':>8} {'err %':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, e in report['endpoints'].items():
+        print(f"{name:<28} {e['requests']:>8,} {e['rps']:>8.1f} {e['error_rate'] * 100:>6.2f}% "
+              f"{e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['max_ms']:>8.1f}")
+        for kind, n in e['error_kinds'].items():
+            print(f"    {kind}: {n}")
+    print(f"\n{report['requests']:,} requests in {report['duration_s']}s "
+          f"({report['rps']:.1f} req/s), error rate {report['error_rate'] * 100:.2f}%")
+    if report.get('sqlite_lock_errors') is not None:
+        print(f"SQLite lock errors in server log: {report['sqlite_lock_errors']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the database and load-test the API')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('seed', help='insert synthetic users and tickets')
+    p.add_argument('--tickets', type=int, default=100000)
+    p.add_argument('--users', type=int, default=100)
+    p.add_argument('--kind', default='typical', help='ticket body kind (see synthetic.py)')
+    p.add_argument('--seed', type=int, default=0)
+
+    p = sub.add_parser('run', help='replay traffic against an instance')
+    p.add_argument('--url', default='http://127.0.0.1:5000')
+    p.add_argument('--serve', action='store_true', help='start a local gunicorn for the run')
+    p.add_argument('--workers', type=int, default=2, help='gunicorn workers with --serve')
+    p.add_argument('--server-log', help='server log to count SQLite lock errors in')
+    p.add_argument('--concurrency', type=int, default=16, help='virtual users')
+    p.add_argument('--users', type=int, default=100, help='seeded accounts to spread them over')
+    p.add_argument('--admin-share', type=float, default=0.1, help='share of virtual users that are admins')
+    p.add_argument('--duration', type=float, default=30.0, help='seconds')
+    p.add_argument('--ramp', type=float, default=0.0, help='seconds to start all virtual users')
+    p.add_argument('--think-ms', type=float, default=0.0, help='mean pause between requests')
+    p.add_argument('--trace', help='JSONL of requests to replay instead of the synthetic mix')
+    p.add_argument('--once', action='store_true', help='stop after one pass over --trace')
+    p.add_argument('--out', help='write the report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        seconds = seed(args.tickets, args.users, args.kind, args.seed)
+        print(f"✅ Seeded {args.tickets:,} tickets for {args.users} users in {seconds:.1f}s "
+              f"(password '{PASSWORD}')")
+        return 0
+
+    server, log_path, offset = None, args.server_log, 0
+    url = args.url
+    if args.serve:
+        log_path = log_path or 'loadtest-server.log'
+        try:
+            server, url = start_server(args.workers, log_path)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"✅ Server on {url} with {args.workers} workers (log: {log_path})")
+    elif log_path and os.path.exists(log_path):
+        offset = os.path.getsize(log_path)
+
+    try:
+        report = run(url, args.concurrency, args.duration, args.users, args.trace,
+                     not args.once, args.think_ms / 1000, args.admin_share, args.ramp)
+    except (OSError, ValueError) as e:
+        print(f"❌ Load test failed: {e}")
+        return 1
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report['url'] = url
+    report['concurrency'] = args.concurrency
+    report['sqlite_lock_errors'] = count_lock_errors(log_path, offset) if log_path else None
+    print_report(report)
+    if not report['requests']:
+        print("⚠️  No requests were made; has the database been seeded (loadtest.py seed)?")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report saved to {args.out}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+Metrics
+Counters, histograms and scrape-time callbacks rendered in the Prometheus
+text exposition format. Recording is a dict update under a lock, so it
+stays on in production.
+
+Every process keeps its own values. With METRICS_DIR set, each process
+also writes a snapshot there every FLUSH_INTERVAL seconds (from a
+background thread) and /metrics sums the snapshots of all gunicorn workers.
+Each snapshot only grows and is named by pid plus a per-process token, so
+the summed counters never go backwards. The directory is cleared when the
+server starts, and each worker zeroes what it inherited from the master.
+Without METRICS_DIR, /metrics shows only the worker that served it.
+"""
+
+import os, json, time, bisect, secrets, threading
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL  = 1.0     # seconds between snapshot writes per process
+
+def _key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}          # key -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        self._observe(_key(self.labelnames, labels), value)
+
+    def _observe(self, key, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            slots = self._values.get(key)
+            if slots is None:
+                slots = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            slots[i] += 1
+            slots[-1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, _key(self.labelnames, labels))
+
+    def values(self):
+        with self._lock:
+            return {key: list(slots) for key, slots in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+class _Timer:
+    # A plain class: about half the cost of a @contextmanager generator
+    __slots__ = ('histogram', 'key', 'started')
+
+    def __init__(self, histogram, key):
+        self.histogram, self.key = histogram, key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self.started)
+
+class Callback:
+    """Values read at collection time: fn() returns a number or {label tuple: number}.
+
+    shared=True marks values that are already global (e.g. read from the
+    database); they are reported once instead of summed across workers.
+    """
+
+    def __init__(self, name, type, help, fn, labelnames=(), shared=False):
+        self.name, self.type, self.help = name, type, help
+        self.labelnames = tuple(labelnames)
+        self.fn, self.shared = fn, shared
+
+    def values(self):
+        result = self.fn()
+        if not isinstance(result, dict):
+            return {(): result}
+        return {k if isinstance(k, tuple) else (k,): v for k, v in result.items()}
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._token = (None, None)      # (pid, random token) naming this process's snapshot
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, type, help, fn, labelnames=(), shared=False):
+        return self._add(Callback(name, type, help, fn, labelnames, shared))
+
+    def reset(self):
+        """Zero every counter and histogram (gunicorn post_fork: values
+        recorded by the master before forking are not the worker's)."""
+        for m in self.metrics.values():
+            if not isinstance(m, Callback):
+                m.reset()
+
+    # ── Collection ───────────────────────────────
+    def collect(self, shared=True):
+        """Snapshot of every metric as JSON-friendly families."""
+        families = {}
+        for m in self.metrics.values():
+            if isinstance(m, Callback) and m.shared and not shared:
+                continue
+            try:
+                values = m.values()
+            except Exception as e:
+                print(f"⚠️  Metric {m.name} failed: {e}")
+                continue
+            families[m.name] = {
+                'type': m.type, 'help': m.help, 'labelnames': list(m.labelnames),
+                'buckets': list(getattr(m, 'buckets', ())),
+                'values': [[list(k), v] for k, v in values.items()],
+            }
+        return families
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR (atomically)."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self._snapshot_name()}.json')
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.collect(shared=False), f)
+        os.replace(tmp, path)
+
+    def _snapshot_name(self):
+        # A worker that reuses an exited worker's pid must not overwrite
+        # that worker's totals, so the name also carries a per-process token
+        pid = os.getpid()
+        if self._token[0] != pid:
+            self._token = (pid, secrets.token_hex(4))
+        return f'{pid}-{self._token[1]}'
+
+    def ensure_flusher(self):
+        """Start the snapshot thread once per process (cheap to call per request)."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name='metrics-flush',
+                                 daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️  Metrics snapshot failed: {e}")
+
+    def reset_directory(self):
+        """Drop snapshots from a previous server run (gunicorn on_starting)."""
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.unlink(os.path.join(self.directory, name))
+
+    def _snapshots(self):
+        """(families, alive) per process: every snapshot file, or just this process."""
+        if not self.directory:
+            yield self.collect(shared=False), True
+            return
+        self.flush()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            pid = int(name.split('-')[0].split('.')[0])
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    families = json.load(f)
+            except (OSError, ValueError):
+                continue
+            try:
+                os.kill(pid, 0)
+                alive = True
+            except ProcessLookupError:
+                alive = False
+            except PermissionError:
+                alive = True
+            yield families, alive
+
+    def merged(self):
+        """Sum counters and histograms over all workers; gauges of exited ones are dropped."""
+        merged = {}
+        for families, alive in self._snapshots():
+            for name, family in families.items():
+                if family['type'] == 'gauge' and not alive:
+                    continue
+                target = merged.setdefault(name, dict(family, values={}))
+                for labels, value in family['values']:
+                    key = tuple(labels)
+                    if key not in target['values']:
+                        target['values'][key] = list(value) if isinstance(value, list) else value
+                    elif isinstance(value, list):
+                        target['values'][key] = [a + b for a, b in zip(target['values'][key], value)]
+                    else:
+                        target['values'][key] += value
+        for name, family in self.collect().items():
+            if name not in merged:        # shared callbacks, reported once
+                merged[name] = dict(family, values={tuple(k): v for k, v in family['values']})
+        return merged
+
+    # ── Exposition ───────────────────────────────
+    def render(self):
+        lines = []
+        for name, family in sorted(self.merged().items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            names = family['labelnames']
+            for key, value in sorted(family['values'].items()):
+                if family['type'] != 'histogram':
+                    lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for le, count in zip([*family['buckets'], float('inf')], value[:-1]):
+                    cumulative += count
+                    le = 'le="%s"' % _number(le)
+                    lines.append(f"{name}_bucket{_labels(names, key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, key)} {_number(float(value[-1]))}")
+                lines.append(f"{name}_count{_labels(names, key)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry(os.environ.get('METRICS_DIR'))
+
+STAGE_SECONDS = registry.histogram(
+    'smartdesk_stage_seconds', 'Time spent in each request stage', ('stage',))
+
+def stage(name):
+    """with stage('preprocess'): ... -- times the block into smartdesk_stage_seconds."""
+    return _Timer(STAGE_SECONDS, (name,))
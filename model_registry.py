@@ -0,0 +1,194 @@
+"""
+Model Registry
+Versioned model directories (models/<version>/) with an active-version
+pointer file, background loading, warm-up validation and atomic swap.
+
+    python model_registry.py list
+    python model_registry.py activate <version>
+
+Running servers notice a changed pointer within CHECK_INTERVAL seconds and
+hot-swap to the new version without dropping in-flight requests.
+"""
+
+import os, sys, json, time, threading
+import numpy as np
+
+from classifier import load_classifier
+from preprocessing import preprocess_batch
+
+POINTER_FILE   = 'CURRENT'
+LEGACY_VERSION = 'legacy'
+CHECK_INTERVAL = 5.0
+RETRY_INTERVAL = 30.0     # before retrying a version that failed to load
+
+WARMUP_TICKETS = [
+    "Laptop will not boot after the latest Windows update",
+    "Urgent: production server down, customers cannot access the portal",
+    "Please send a copy of last month's invoice for our records",
+    "Request to install Slack and Zoom on a new workstation",
+    "VPN connection drops every few minutes when working from home",
+    "",
+]
+
+class ModelBundle:
+    """One loaded model version; never mutated after it is published."""
+
+    def __init__(self, version, model, stats, path):
+        self.version   = version
+        self.model     = model
+        self.stats     = dict(stats, version=version)
+        self.path      = path
+        self.loaded_at = time.time()
+
+class ModelRegistry:
+    def __init__(self, root='models', on_swap=None, loader=None):
+        self.root    = root
+        self.current = None          # swapped by reference; readers never lock
+        self.on_swap = on_swap
+        self.loader  = loader        # loader(version, path) -> model; default loads from disk
+        self._lock   = threading.Lock()
+        self._loading = None
+        self._last_check = 0.0
+        self.last_error  = None
+        self._failed_at  = 0.0
+
+    # ── Version discovery ────────────────────────
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, 'stats.json'))
+        )
+
+    def active_version(self):
+        """Version named by the pointer file, or None for the legacy flat layout."""
+        try:
+            with open(os.path.join(self.root, POINTER_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_active_version(self, version):
+        """Atomically repoint CURRENT; every server process follows it."""
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version: {version}")
+        tmp = os.path.join(self.root, f'.{POINTER_FILE}.{os.getpid()}')
+        with open(tmp, 'w') as f:
+            f.write(version + '\n')
+        os.replace(tmp, os.path.join(self.root, POINTER_FILE))
+
+    # ── Loading ──────────────────────────────────
+    def load_bundle(self, version=None):
+        if version in (None, LEGACY_VERSION):
+            version, path = LEGACY_VERSION, self.root
+        else:
+            path = os.path.join(self.root, version)
+        model = self.loader(version, path) if self.loader else load_classifier(path)
+        with open(os.path.join(path, 'stats.json')) as f:
+            stats = json.load(f)
+        return ModelBundle(version, model, stats, path)
+
+    @staticmethod
+    def warm_up(bundle):
+        """Score a small batch and reject the bundle if the output looks wrong."""
+        texts = preprocess_batch(WARMUP_TICKETS)
+        probs = bundle.model.predict_proba(texts)
+        classes = bundle.model.classes_
+        if not probs:
+            raise ValueError("model returned no heads")
+        missing = set(classes) - set(probs)
+        if missing:
+            raise ValueError(f"heads failed: {', '.join(sorted(missing))}")
+        for head, p in probs.items():
+            p = np.asarray(p)
+            if p.shape != (len(texts), len(classes[head])):
+                raise ValueError(f"{head}: unexpected output shape {p.shape}")
+            if not np.all(np.isfinite(p)) or not np.allclose(p.sum(axis=1), 1.0, atol=1e-3):
+                raise ValueError(f"{head}: probabilities are not normalized")
+
+    def activate(self, version=None):
+        """Load, validate and publish a version (default: the pointer's)."""
+        if version is None:
+            version = self.active_version()
+        try:
+            bundle = self.load_bundle(version)
+            self.warm_up(bundle)
+        except Exception as e:
+            self.last_error = f"{version or LEGACY_VERSION}: {e}"
+            self._failed_at = time.monotonic()
+            raise
+        with self._lock:
+            self.current = bundle
+            self.last_error = None
+        if self.on_swap:
+            self.on_swap(bundle)
+        return bundle
+
+    def reload_async(self, version=None, publish=False):
+        """Activate a version on a background thread; returns False if one is running.
+
+        With publish=True the pointer file is moved once the version has
+        passed warm-up, so the other workers follow it.
+        """
+        with self._lock:
+            if self._loading is not None:
+                return False
+            self._loading = version or self.active_version() or LEGACY_VERSION
+        threading.Thread(target=self._reload, args=(version, publish),
+                         daemon=True).start()
+        return True
+
+    def _reload(self, version, publish):
+        try:
+            bundle = self.activate(version)
+            if publish and bundle.version != LEGACY_VERSION:
+                self.set_active_version(bundle.version)
+            print(f"✅ Model version {bundle.version} activated")
+        except Exception:
+            print(f"⚠️  Model reload failed: {self.last_error}")
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def maybe_refresh(self):
+        """Cheap per-request check: reload in the background if CURRENT moved."""
+        now = time.monotonic()
+        if now - self._last_check < CHECK_INTERVAL:
+            return
+        self._last_check = now
+        wanted = self.active_version() or LEGACY_VERSION
+        current = self.current.version if self.current else None
+        recently_failed = (self.last_error or '').startswith(f"{wanted}:") \
+            and now - self._failed_at < RETRY_INTERVAL
+        if wanted != current and not recently_failed:
+            self.reload_async(wanted)
+
+    def status(self):
+        bundle = self.current
+        return {
+            'current': bundle.version if bundle else None,
+            'loaded_at': bundle.loaded_at if bundle else None,
+            'active': self.active_version(),
+            'versions': self.versions(),
+            'loading': self._loading,
+            'last_error': self.last_error,
+        }
+
+def main(argv):
+    registry = ModelRegistry()
+    if argv[:1] == ['list']:
+        active = registry.active_version()
+        for version in registry.versions():
+            print(f"{'*' if version == active else ' '} {version}")
+    elif argv[:1] == ['activate'] and len(argv) == 2:
+        bundle = registry.activate(argv[1])
+        registry.set_active_version(bundle.version)
+        print(f"✅ {bundle.version} validated and activated")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,290 @@
+"""
+Online Learning
+Learns from admin label corrections without a full retrain. Every model
+version carries a small hashing-feature SGD model (online/state.pkl) next to
+its calibrated heads. Pending corrections, mixed with a replay sample of
+recent tickets so the online model does not forget everything else, are
+applied with partial_fit, and the result is published as a new version that
+blends the unchanged base engine with the updated online engine.
+
+    python online_learning.py publish     # learn pending corrections now
+    python online_learning.py watch       # keep doing so every --interval seconds
+"""
+
+import os, sys, json, time, fcntl, shutil, argparse, threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+from database import pool
+from inference import HashingFeaturizer, export_linear
+from model_registry import ModelRegistry, LEGACY_VERSION
+from preprocessing import preprocess_batch
+
+ONLINE_DIR        = 'online'
+STATE_FILE        = 'state.pkl'
+BLEND_FILE        = 'blend.json'
+CORRECTIONS_FILE  = 'corrections.json'     # ids of the corrections a version absorbed
+LOCK_FILE         = '.online.lock'
+ONLINE_FEATURES   = 2 ** 18
+# The online model's share of the blend starts small and grows with the
+# corrections it has absorbed, reaching BLEND_MAX_WEIGHT after BLEND_RAMP
+BLEND_WEIGHT      = float(os.environ.get('ONLINE_BLEND_WEIGHT', 0.15))
+BLEND_MAX_WEIGHT  = float(os.environ.get('ONLINE_BLEND_MAX_WEIGHT', 0.5))
+BLEND_RAMP        = 200
+CORRECTION_WEIGHT = 50.0     # sample weight of a correction vs. a replayed ticket
+CORRECTION_EPOCHS = 5
+REPLAY_RATIO      = 10       # replayed recent tickets per correction
+ONLINE_ETA        = 0.1      # constant step size for updates
+
+CORRECTABLE = ('category', 'queue', 'priority')
+
+class OnlineState:
+    """Hashing featurizer plus one SGDClassifier per head; updatable with partial_fit."""
+
+    def __init__(self, featurizer, heads, learned=0):
+        self.featurizer = featurizer
+        self.heads      = heads
+        self.learned    = learned      # corrections absorbed so far
+
+    @classmethod
+    def load(cls, version_dir):
+        path = os.path.join(version_dir, ONLINE_DIR, STATE_FILE)
+        if not os.path.exists(path):
+            return None
+        data = joblib.load(path)
+        params = dict(data['featurizer'])
+        params.pop('type', None)
+        return cls(HashingFeaturizer(data['idf'], **params), data['heads'], data['learned'])
+
+    def save(self, version_dir):
+        out = os.path.join(version_dir, ONLINE_DIR)
+        os.makedirs(out, exist_ok=True)
+        joblib.dump({'featurizer': self.featurizer.params(), 'idf': self.featurizer.idf,
+                     'heads': self.heads, 'learned': self.learned},
+                    os.path.join(out, STATE_FILE))
+
+    def learn(self, examples, weights):
+        """partial_fit each head on {head: (clean_texts, labels)} with per-row weights."""
+        for head, (texts, labels) in examples.items():
+            if not texts:
+                continue
+            X = self.featurizer.transform(texts)
+            clf = self.heads[head]
+            clf.set_params(learning_rate='constant', eta0=ONLINE_ETA)
+            for _ in range(CORRECTION_EPOCHS):
+                clf.partial_fit(X, np.asarray(labels), sample_weight=weights[head])
+
+def blend_weight(learned):
+    """Weight of the online model after learning this many corrections."""
+    return BLEND_WEIGHT + (BLEND_MAX_WEIGHT - BLEND_WEIGHT) * min(learned / BLEND_RAMP, 1.0)
+
+def fit_state(texts, labels, classes, class_weights=None, epochs=3,
+              n_features=ONLINE_FEATURES):
+    """Fit a fresh online state in memory from {head: labels} and {head: classes}."""
+    featurizer = HashingFeaturizer(n_features=n_features, ngram_range=(1, 3),
+                                   sublinear_tf=True)
+    counts = featurizer.counts(texts)
+    doc_freq = np.bincount(counts.indices, minlength=n_features)
+    featurizer.idf = np.log((1 + counts.shape[0]) / (1 + doc_freq)) + 1   # smooth_idf
+    X = featurizer.transform(texts)
+
+    heads = {}
+    rng = np.random.default_rng(42)
+    for head, y in labels.items():
+        y = np.asarray(y, dtype=str)
+        class_weight = (class_weights or {}).get(head)
+        if class_weight == 'balanced':
+            # partial_fit only takes explicit weights
+            values, n = np.unique(y, return_counts=True)
+            class_weight = dict(zip(values, len(y) / (len(values) * n)))
+        clf = SGDClassifier(loss='log_loss', alpha=1e-6, class_weight=class_weight,
+                            random_state=42)
+        for _ in range(epochs):
+            order = rng.permutation(len(y))
+            clf.partial_fit(X[order], y[order], classes=np.asarray(classes[head], dtype=str))
+        heads[head] = clf
+    return OnlineState(featurizer, heads)
+
+def bootstrap_state(bundle):
+    """Online state for a version trained before online heads existed."""
+    from train_models import HEAD_LABELS, load_dataset
+    frame = load_dataset()['frame']
+    classes = bundle.model.classes_
+    return fit_state(frame['text_clean'],
+                     {head: frame[label] for head, (label, _) in HEAD_LABELS.items()},
+                     {head: classes[head] for head in HEAD_LABELS},
+                     {head: weight for head, (_, weight) in HEAD_LABELS.items()})
+
+def _link_tree(src, dst):
+    """Hard-link a directory of arrays (shares pages with the base version)."""
+    os.makedirs(dst, exist_ok=True)
+    for name in os.listdir(src):
+        try:
+            os.link(os.path.join(src, name), os.path.join(dst, name))
+        except OSError:
+            shutil.copy2(os.path.join(src, name), os.path.join(dst, name))
+
+def pending_corrections(conn):
+    """Unlearned corrections; those of deleted tickets are kept but skipped."""
+    return conn.execute(
+        """SELECT c.id, c.field, c.new_value, t.subject, t.body
+           FROM ticket_corrections c JOIN tickets t ON t.id = c.ticket_id
+           WHERE c.learned_in IS NULL ORDER BY c.id"""
+    ).fetchall()
+
+def replay_sample(conn, limit):
+    """Recent uncorrected tickets with their current labels."""
+    return conn.execute(
+        """SELECT subject, body, category, queue, priority FROM tickets
+           WHERE category IS NOT NULL AND queue IS NOT NULL AND priority IS NOT NULL
+           AND id NOT IN (SELECT ticket_id FROM ticket_corrections)
+           ORDER BY id DESC LIMIT ?""",
+        (limit,)
+    ).fetchall()
+
+def training_examples(corrections, replay, classes):
+    """Build {head: (texts, labels)} and {head: weights}, latest correction winning."""
+    latest = {}
+    for c in corrections:
+        latest[(c['subject'], c['body'], c['field'])] = c['new_value']
+
+    examples, weights = {}, {}
+    for head in CORRECTABLE:
+        known = set(classes[head])
+        rows = [((s, b), v, CORRECTION_WEIGHT) for (s, b, f), v in latest.items()
+                if f == head and v in known]
+        rows += [((r['subject'], r['body']), r[head], 1.0) for r in replay if r[head] in known]
+        texts = preprocess_batch(f"{s} {b}" for (s, b), _, _ in rows)
+        examples[head] = (texts, [v for _, v, _ in rows])
+        weights[head]  = np.array([w for _, _, w in rows])
+    return examples, weights
+
+def mark_learned(registry, version):
+    """Set learned_in for the corrections recorded in a published version (idempotent)."""
+    path = os.path.join(registry.root, version, ONLINE_DIR, CORRECTIONS_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        ids = json.load(f)
+    with pool.connection() as conn:
+        conn.executemany(
+            'UPDATE ticket_corrections SET learned_in=? WHERE id=? AND learned_in IS NULL',
+            [(version, cid) for cid in ids]
+        )
+        conn.commit()
+
+def publish_corrections(registry, min_corrections=1, version=None):
+    """Learn pending corrections on top of the active version and activate the result.
+
+    Returns the new version name, or None when fewer than min_corrections
+    are pending. A lock file keeps concurrent publishers (several web
+    workers, the CLI) from learning the same corrections twice.
+    """
+    with open(os.path.join(registry.root, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _publish(registry, min_corrections, version)
+
+def _publish(registry, min_corrections, version):
+    base_version = registry.active_version()
+    if base_version in (None, LEGACY_VERSION):
+        raise ValueError("online learning needs a versioned model (run train_models.py)")
+    base_dir = os.path.join(registry.root, base_version)
+    if not os.path.exists(os.path.join(base_dir, 'compiled', 'meta.json')):
+        raise ValueError(f"model version {base_version} has no compiled engine")
+    # Finish a previous publish that moved CURRENT but stopped before marking
+    mark_learned(registry, base_version)
+
+    with pool.connection() as conn:
+        corrections = pending_corrections(conn)
+        if len(corrections) < max(min_corrections, 1):
+            return None
+        replay = replay_sample(conn, REPLAY_RATIO * len(corrections))
+
+    bundle = registry.load_bundle(base_version)
+    state = OnlineState.load(base_dir) or bootstrap_state(bundle)
+    examples, weights = training_examples(corrections, replay, bundle.model.classes_)
+    state.learn(examples, weights)
+    state.learned += len(corrections)
+
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S') + '-online'
+    out_dir = os.path.join(registry.root, version)
+    _link_tree(os.path.join(base_dir, 'compiled'), os.path.join(out_dir, 'compiled'))
+    state.save(out_dir)
+    export_linear(state.featurizer, state.heads, os.path.join(out_dir, ONLINE_DIR, 'compiled'))
+    with open(os.path.join(out_dir, ONLINE_DIR, BLEND_FILE), 'w') as f:
+        json.dump({'weight': round(blend_weight(state.learned), 4)}, f)
+    with open(os.path.join(out_dir, ONLINE_DIR, CORRECTIONS_FILE), 'w') as f:
+        json.dump([c['id'] for c in corrections], f)
+    stats = dict(bundle.stats, version=version, base_version=base_version,
+                 online_corrections=state.learned,
+                 trained_at=datetime.now().isoformat(timespec='seconds'))
+    with open(os.path.join(out_dir, 'stats.json'), 'w') as f:
+        json.dump(stats, f, indent=2)
+
+    # Warm-up validates the blend before any server follows the pointer.
+    # Moving CURRENT is the commit point: the version's corrections.json says
+    # what it learned, so the next publish redoes the marking if we stop here
+    registry.activate(version)
+    registry.set_active_version(version)
+    mark_learned(registry, version)
+    return version
+
+class CorrectionPublisher:
+    """Runs publish_corrections on a background thread, one at a time."""
+
+    def __init__(self, registry):
+        self.registry   = registry
+        self.running    = False
+        self.last_error = None
+        self.last_version = None
+        self._lock = threading.Lock()
+
+    def start(self, min_corrections=1):
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+        threading.Thread(target=self._run, args=(min_corrections,), daemon=True).start()
+        return True
+
+    def _run(self, min_corrections):
+        try:
+            version = publish_corrections(self.registry, min_corrections)
+            if version:
+                self.last_version, self.last_error = version, None
+                print(f"✅ Corrections learned into model version {version}")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️  Online learning failed: {e}")
+        finally:
+            with self._lock:
+                self.running = False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Learn admin corrections into a new model version')
+    parser.add_argument('command', choices=('publish', 'watch'))
+    parser.add_argument('--min-corrections', type=int, default=1)
+    parser.add_argument('--interval', type=float, default=60.0, help='seconds between checks (watch)')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry('models')
+    while True:
+        started = time.perf_counter()
+        try:
+            version = publish_corrections(registry, args.min_corrections)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        if version:
+            print(f"✅ Published {version} in {time.perf_counter() - started:.1f}s")
+        elif args.command == 'publish':
+            print("Nothing to learn: no pending corrections")
+        if args.command == 'publish':
+            return 0
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Text Normalization
+Shared by train_models.py and app.py so training and serving build features
+from identically cleaned text.
+"""
+
+STOP_WORDS = frozenset({
+    'the','a','an','and','or','but','in','on','at','to','for','of','with',
+    'is','are','was','were','be','been','being','have','has','had','do',
+    'does','did','will','would','could','should','may','might','shall',
+    'this','that','these','those','i','we','you','he','she','they','it',
+    'my','our','your','his','her','their','its','me','us','him',
+    'dear','customer','support','team','hello','hi','hope','message',
+    'reaching','out','please','thank','thanks','regards','sincerely',
+    'writing','contact','help','assist','assistance','kind','kindly',
+})
+
+MIN_TOKEN_LEN = 3
+
+class _CharFilter(dict):
+    """str.translate table keeping [a-z0-9] and turning everything else into a space.
+
+    Non-ASCII code points are resolved on first sight and memoized.
+    """
+
+    def __missing__(self, codepoint):
+        ch = chr(codepoint)
+        value = codepoint if ('a' <= ch <= 'z' or '0' <= ch <= '9') else 32
+        self[codepoint] = value
+        return value
+
+_CHAR_FILTER = _CharFilter()
+for _cp in range(128):
+    _CHAR_FILTER[_cp]
+
+def preprocess(text):
+    """Lowercase, keep alphanumerics, drop stop words and tokens under 3 chars."""
+    if not isinstance(text, str):
+        return ""
+    return ' '.join([w for w in text.lower().translate(_CHAR_FILTER).split()
+                     if len(w) >= MIN_TOKEN_LEN and w not in STOP_WORDS])
+
+def preprocess_batch(texts):
+    """preprocess() over any iterable of texts (list, Series, generator)."""
+    table, stop, min_len = _CHAR_FILTER, STOP_WORDS, MIN_TOKEN_LEN
+    return [
+        ' '.join([w for w in text.lower().translate(table).split()
+                  if len(w) >= min_len and w not in stop])
+        if isinstance(text, str) else ""
+        for text in texts
+    ]
@@ -0,0 +1,219 @@
+"""
+Request Profiling
+Profiles single requests on demand. Admins add "X-Profile: sample" (or
+?profile=sample) to a request, or PROFILE_SAMPLE_RATE profiles that fraction
+of all traffic. Nothing runs for requests that are not profiled.
+
+Modes:
+    sample    a thread samples the request thread's stack every
+              PROFILE_INTERVAL_MS; writes <name>.folded, collapsed stacks
+              for flamegraph.pl / speedscope / the built-in SVG view
+    cprofile  deterministic cProfile of the request thread; writes
+              <name>.prof (pstats, e.g. for snakeviz) and <name>.txt
+
+Each profile also gets <name>.json with the request details. Files go to
+PROFILE_DIR (default profiles/) and only the newest KEEP_PROFILES are kept.
+"""
+
+import os, sys, json, time, zlib, random, cProfile, pstats, threading
+from collections import Counter
+from datetime import datetime
+from html import escape
+from io import StringIO
+
+PROFILE_DIR   = os.environ.get('PROFILE_DIR', 'profiles')
+SAMPLE_RATE   = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+INTERVAL      = float(os.environ.get('PROFILE_INTERVAL_MS', 1)) / 1000
+KEEP_PROFILES = 200
+MODES         = ('sample', 'cprofile')
+
+_local = threading.local()
+
+def active():
+    """True while the calling thread is being profiled."""
+    return getattr(_local, 'profiling', False)
+
+def requested(flag, is_admin):
+    """Mode to profile this request with, or None.
+
+    flag is the X-Profile header or ?profile= value; only admins may set it.
+    """
+    if flag and is_admin:
+        flag = flag.lower()
+        return 'sample' if flag in ('1', 'true', 'yes') else flag if flag in MODES else None
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        return 'sample'
+    return None
+
+_names = {}
+
+def _frame_name(code):
+    name = _names.get(code)
+    if name is None:
+        path = code.co_filename
+        for base in sorted(filter(None, sys.path), key=len, reverse=True):
+            if path.startswith(base + os.sep):
+                path = path[len(base) + 1:]
+                break
+        name = _names[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return name
+
+def collapse(frame):
+    """Root-first 'a;b;c' stack of a frame."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class StackSampler:
+    """Samples one thread's stack from a helper thread."""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval  = interval
+        self.stacks    = Counter()
+        self._stop     = threading.Event()
+        self._thread   = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            # The request thread is inside start()/finish() itself
+            if frame.f_code.co_filename != __file__:
+                self.stacks[collapse(frame)] += 1
+            del frame
+
+class RequestProfiler:
+    """Profiles the current thread between start() and finish()."""
+
+    def __init__(self, mode='sample', directory=PROFILE_DIR):
+        self.mode      = mode
+        self.directory = directory
+        self.name      = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}"
+        self.status    = None
+        self._sampler  = None
+        self._profile  = None
+
+    def start(self):
+        _local.profiling = True
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+
+    def finish(self, **details):
+        """Stop profiling and write the files; returns the profile name."""
+        elapsed = time.perf_counter() - self.started
+        _local.profiling = False
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.name)
+        meta = dict(details, name=self.name, mode=self.mode, status=self.status,
+                    duration_ms=round(elapsed * 1000, 2), pid=os.getpid(),
+                    created_at=datetime.now().isoformat(timespec='seconds'))
+
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(base + '.prof')
+            out = StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(40)
+            with open(base + '.txt', 'w') as f:
+                f.write(out.getvalue())
+            meta['files'] = [self.name + '.prof', self.name + '.txt']
+        else:
+            stacks = self._sampler.stop()
+            with open(base + '.folded', 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            meta['samples'] = sum(stacks.values())
+            meta['files'] = [self.name + '.folded']
+
+        with open(base + '.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        prune(self.directory)
+        return self.name
+
+def prune(directory=PROFILE_DIR, keep=KEEP_PROFILES):
+    names = sorted(n[:-5] for n in os.listdir(directory) if n.endswith('.json'))
+    for name in names[:-keep]:
+        for ext in ('.json', '.folded', '.prof', '.txt'):
+            try:
+                os.unlink(os.path.join(directory, name + ext))
+            except FileNotFoundError:
+                pass
+
+def recent(directory=PROFILE_DIR, limit=50):
+    """Metadata of the newest profiles, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((n for n in os.listdir(directory) if n.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+def read_folded(path):
+    stacks = {}
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] = stacks.get(stack, 0) + int(count)
+    return stacks
+
+def flamegraph_svg(stacks, title='', width=1200, row=16):
+    """Render collapsed stacks as a static SVG flame graph (hover for details)."""
+    root = {'children': {}, 'count': 0}
+    for stack, count in stacks.items():
+        node = root
+        node['count'] += count
+        for name in stack.split(';'):
+            node = node['children'].setdefault(name, {'children': {}, 'count': 0})
+            node['count'] += count
+    total = root['count'] or 1
+
+    rects, depth_max = [], 0
+    def walk(node, x, depth):
+        nonlocal depth_max
+        depth_max = max(depth_max, depth)
+        for name, child in sorted(node['children'].items()):
+            w = child['count'] / total * width
+            if w >= 0.5:
+                rects.append((x, depth, w, name, child['count']))
+                walk(child, x, depth + 1)
+            x += w
+    walk(root, 0.0, 0)
+
+    height = (depth_max + 1) * row + 30
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'font-family="monospace" font-size="11">',
+           f'<text x="4" y="14">{escape(title)} ({total} samples)</text>']
+    for x, depth, w, name, count in rects:
+        y = height - (depth + 1) * row
+        hue = 20 + zlib.crc32(name.encode()) % 40
+        label = escape(name)
+        chars = int(w / 7)
+        text = label if len(label) <= chars else (label[:chars - 2] + '..' if chars > 3 else '')
+        out.append(f'<g><title>{label} — {count} samples ({count / total:.1%})</title>'
+                   f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                   f'fill="hsl({hue},85%,60%)"/>'
+                   f'<text x="{x + 2:.1f}" y="{y + row - 4}">{text}</text></g>')
+    out.append('</svg>')
+    return '\n'.join(out)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Rebuild Stats - SmartDesk
+Recomputes the ticket_counters table behind /api/stats and the
+ticket_rollups table behind /api/stats/timeseries from the tickets table.
+Triggers keep both current; run this to backfill after restoring a backup,
+bulk-editing tickets by hand, or if the numbers ever look off.
+
+    python rebuild_stats.py [--only counters|rollups]
+"""
+
+import time
+import argparse
+
+from database import pool, init_db, rebuild_counters, rebuild_rollups
+
+def rebuild_stats(only=None):
+    init_db()
+    with pool.connection() as conn:
+        total = conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
+        if only in (None, 'counters'):
+            start = time.perf_counter()
+            rebuild_counters(conn)
+            rows = conn.execute('SELECT COUNT(*) FROM ticket_counters').fetchone()[0]
+            print(f"✅ Rebuilt {rows} counters for {total} tickets "
+                  f"in {time.perf_counter() - start:.2f}s")
+        if only in (None, 'rollups'):
+            start = time.perf_counter()
+            rebuild_rollups(conn)
+            rows = conn.execute('SELECT COUNT(*) FROM ticket_rollups').fetchone()[0]
+            print(f"✅ Rebuilt {rows} rollup buckets for {total} tickets "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild SmartDesk stats tables')
+    parser.add_argument('--only', choices=['counters', 'rollups'])
+    rebuild_stats(parser.parse_args().only)
@@ -19,7 +19,7 @@ echo "📦 Installing dependencies..."
 pip install flask scikit-learn pandas numpy joblib werkzeug --break-system-packages -q
 
 # Train models if not present
-if [ ! -f "models/category_model.pkl" ]; then
+if [ ! -f "models/CURRENT" ]; then
     echo "🧠 Training ML models from dataset..."
     python3 train_models.py
 else
@@ -6,6 +6,11 @@ let allTickets = [];
 let currentFilter = 'all';
 let currentEditId = null;
 let isAdmin = false;
+let nextCursor = null;
+
+// Only the columns the table renders; bodies and notes stay on the server
+const LIST_FIELDS = 'id,subject,user_name,category,priority,queue,status,created_at';
+const PAGE_SIZE   = 100;
 
 // ── Priority badge classes ──
 const PRIORITY_CLASS = { high: 'pill-high', medium: 'pill-medium', low: 'pill-low' };
@@ -33,10 +38,20 @@ async function loadStats() {
   }
 }
 
-async function loadTickets() {
-  const sort = document.getElementById('sortSelect')?.value || 'date';
-  const res  = await fetch(`/api/tickets?sort=${sort}`);
-  allTickets = await res.json();
+async function loadTickets(append = false) {
+  const params = new URLSearchParams({
+    sort:   document.getElementById('sortSelect')?.value || 'date',
+    fields: LIST_FIELDS,
+    limit:  PAGE_SIZE,
+  });
+  if (currentFilter !== 'all') params.set('status', currentFilter);
+  if (append && nextCursor) params.set('cursor', nextCursor);
+
+  const res  = await fetch(`/api/tickets?${params}`);
+  const page = await res.json();
+  allTickets = append ? allTickets.concat(page.tickets) : page.tickets;
+  nextCursor = page.next_cursor;
+  document.getElementById('loadMoreBtn')?.classList.toggle('hidden', !nextCursor);
   
   // Update table header for admin
   if (isAdmin && allTickets.length > 0 && allTickets[0].user_name) {
@@ -56,11 +71,7 @@ function filterTickets(btn, filter) {
   currentFilter = filter;
   document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
   btn.classList.add('active');
-
-  const filtered = filter === 'all'
-    ? allTickets
-    : allTickets.filter(t => t.status === filter);
-  renderTickets(filtered);
+  loadTickets();
 }
 
 function renderTickets(tickets) {
@@ -0,0 +1,132 @@
+"""
+Synthetic Tickets
+Deterministic generator of realistic-looking support tickets for benchmarks
+and load tests. Terms come from the entity dictionary, so the scanner and
+models see the vocabulary they were built for, and every ticket carries a
+few random identifiers so no two texts are identical (no accidental cache
+hits).
+
+Body kinds:
+    short    one line, e.g. "Outlook crash on laptop (INC00001234)"
+    typical  a few sentences with devices, software and errors
+    logs     a typical body followed by a pasted log or stack trace
+
+    python synthetic.py 1000 --kind mixed > tickets.jsonl
+"""
+
+import sys, json, random, argparse
+
+from entities import DEFAULT_DICTIONARY
+
+KINDS = ('short', 'typical', 'logs')
+MIXED_WEIGHTS = (0.3, 0.6, 0.1)      # share of each kind in --kind mixed
+URGENT_SHARE  = 0.05
+
+SUBJECTS = [
+    "{software} {error} on {device}",
+    "{device} not working",
+    "Cannot use {software}",
+    "Request: {software} access for new starter",
+    "{error} when opening {software}",
+    "Invoice {ref} question",
+    "{device} keeps showing {error}",
+]
+
+SENTENCES = [
+    "Since this morning my {device} shows {error} whenever I open {software}.",
+    "I already restarted the {device} twice but {software} still fails.",
+    "Several colleagues on the {floor} floor report the same problem.",
+    "The ticket reference from last time was {ref}.",
+    "Could you please install {software} on workstation {host}?",
+    "We were charged twice on invoice {ref}, please advise.",
+    "The {device} in meeting room {room} has not worked since the update.",
+    "Error message: '{error}' after signing in to {software}.",
+    "It started after the {software} update was pushed last night.",
+    "I need access to the shared drive for project {ref}.",
+]
+
+LOG_LINES = [
+    "{ts} ERROR [{software}] {error} (code 0x{hex})",
+    "{ts} WARN  connection to {host}:{port} timed out after {ms}ms",
+    "{ts} INFO  retrying request {ref} attempt {n}",
+    '  File "/opt/app/{module}.py", line {n}, in handle_request',
+    "    at com.corp.{module}.Service.call({module}.java:{n})",
+    "{ts} DEBUG heap={n}MB threads={port} pid={ms}",
+]
+
+def _vocabulary(path=None):
+    with open(path or DEFAULT_DICTIONARY) as f:
+        data = json.load(f)
+    entities = data.get('entities', {})
+    return {
+        'device':   entities.get('devices') or ['laptop'],
+        'software': entities.get('software') or ['outlook'],
+        'error':    entities.get('errors') or ['error'],
+        'urgency':  data.get('urgency') or ['urgent'],
+    }
+
+class TicketGenerator:
+    """Yields {'subject', 'body'} dicts; the same seed gives the same tickets."""
+
+    def __init__(self, seed=0, dictionary=None):
+        self.rng   = random.Random(seed)
+        self.vocab = _vocabulary(dictionary)
+        self.count = 0
+
+    def _fields(self):
+        rng, vocab = self.rng, self.vocab
+        self.count += 1
+        return {
+            'device':   rng.choice(vocab['device']),
+            'software': rng.choice(vocab['software']),
+            'error':    rng.choice(vocab['error']),
+            'ref':      f"INC{self.count:06d}{rng.randrange(100):02d}",
+            'host':     f"ws-{rng.randrange(10000):04d}",
+            'room':     f"{rng.randrange(1, 9)}.{rng.randrange(1, 40):02d}",
+            'floor':    rng.choice(('first', 'second', 'third', 'fourth')),
+            'port':     rng.choice((22, 80, 443, 3389, 5432, 8080)),
+            'ms':       rng.randrange(100, 30000),
+            'n':        rng.randrange(1, 900),
+            'hex':      f"{rng.getrandbits(32):08x}",
+            'module':   rng.choice(('auth', 'billing', 'sync', 'gateway', 'mailer')),
+            'ts':       f"2024-0{rng.randrange(1, 10)}-{rng.randrange(10, 29)}T"
+                        f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+        }
+
+    def ticket(self, kind='typical'):
+        rng = self.rng
+        if kind == 'mixed':
+            kind = rng.choices(KINDS, MIXED_WEIGHTS)[0]
+        fields = self._fields()
+        subject = rng.choice(SUBJECTS).format(**fields)
+        if kind == 'short':
+            body = f"{subject} ({fields['ref']})"
+        else:
+            # The first sentence matches the subject; the rest vary
+            body = ' '.join(rng.choice(SENTENCES).format(**(fields if i == 0 else self._fields()))
+                            for i in range(rng.randint(3, 6)))
+            if kind == 'logs':
+                lines = [rng.choice(LOG_LINES).format(**self._fields())
+                         for _ in range(rng.randint(40, 200))]
+                body += "\n\nLog output:\n" + '\n'.join(lines)
+        if rng.random() < URGENT_SHARE:
+            body = f"{rng.choice(self.vocab['urgency']).capitalize()}: {body}"
+        return {'subject': subject[:1].upper() + subject[1:], 'body': body}
+
+    def tickets(self, n, kind='typical'):
+        return [self.ticket(kind) for _ in range(n)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic tickets as JSONL')
+    parser.add_argument('count', type=int)
+    parser.add_argument('--kind', choices=(*KINDS, 'mixed'), default='mixed')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    generator = TicketGenerator(args.seed)
+    for _ in range(args.count):
+        sys.stdout.write(json.dumps(generator.ticket(args.kind)) + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
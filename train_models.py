@@ -1,162 +1,359 @@
 """
 ML Model Training Script
-Trains category (type) and priority models from the tickets dataset.
+Trains category (type), priority and queue heads on one shared TF-IDF
+vocabulary from the tickets dataset and saves them as a new version under
+models/<version>/.
+
+The cleaned dataset is cached under data/.cache/, keyed by a hash of the CSV
+and of preprocessing.py, and the heads and their calibration folds train in
+parallel (--jobs).
+
+--streaming trains out of core for exports larger than RAM: the CSV is read
+in chunks, features are hashed instead of building a vocabulary, and
+SGD heads learn with partial_fit. The result exports to the same compiled
+engine.
 """
 
 import pandas as pd
 import numpy as np
-import re
 import joblib
 import os
+import time
 import json
+import zlib
+import hashlib
+import argparse
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from joblib import Parallel, delayed
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.svm import LinearSVC
-from sklearn.pipeline import Pipeline
+from sklearn.linear_model import SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 from sklearn.calibration import CalibratedClassifierCV
 
-STOP_WORDS = {
-    'the','a','an','and','or','but','in','on','at','to','for','of','with',
-    'is','are','was','were','be','been','being','have','has','had','do',
-    'does','did','will','would','could','should','may','might','shall',
-    'this','that','these','those','i','we','you','he','she','they','it',
-    'my','our','your','his','her','their','its','me','us','him','her',
-    'dear','customer','support','team','hello','hi','hope','message',
-    'reaching','out','please','thank','thanks','regards','sincerely',
-    'writing','contact','help','assist','assistance','kind','kindly',
+from classifier import MultiHeadClassifier
+from inference import export_engine, export_linear, HashingFeaturizer, LinearEngine
+from model_registry import ModelRegistry
+from online_learning import OnlineState, fit_state
+import preprocessing
+from preprocessing import preprocess_batch
+
+# head name -> (label column, LinearSVC class_weight)
+HEAD_LABELS = {
+    'category': ('type', None),
+    'priority': ('priority', 'balanced'),
+    'queue':    ('queue', 'balanced'),
 }
 
-def preprocess(text):
-    if not isinstance(text, str):
-        return ""
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    tokens = [w for w in text.split() if w not in STOP_WORDS and len(w) > 2]
-    return ' '.join(tokens)
+LABEL_COLUMNS = [label for label, _ in HEAD_LABELS.values()]
+
+DATASET    = 'data/tickets.csv'
+CACHE_DIR  = 'data/.cache'
+CHUNK_ROWS = 50000
+# Only these columns are read; labels and language as categoricals
+CSV_DTYPES = {'subject': 'string', 'body': 'string', 'language': 'category',
+              **{label: 'category' for label in LABEL_COLUMNS}}
+
+@contextmanager
+def stage(name, timings):
+    """Time a training stage, print it and record it for stats.json."""
+    started = time.perf_counter()
+    yield
+    timings[name] = round(time.perf_counter() - started, 2)
+    print(f"⏱  {name}: {timings[name]:.2f}s")
+
+def dataset_key(path):
+    """Hash of the dataset and of the preprocessing code that cleans it."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    with open(preprocessing.__file__, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def iter_chunks(path=DATASET, chunksize=CHUNK_ROWS, languages=None):
+    """Stream cleaned, labelled English rows from the CSV one chunk at a time.
+
+    Yields frames of text_clean plus the label columns. languages, if given,
+    is a Counter updated with every row's language before filtering.
+    """
+    reader = pd.read_csv(path, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES,
+                         chunksize=chunksize)
+    for chunk in reader:
+        if languages is not None:
+            languages.update({k: v for k, v in chunk['language'].value_counts().items() if v})
+
+        # Filter English only for better model performance
+        chunk = chunk[chunk['language'] == 'en']
+        if chunk.empty:
+            continue
+
+        # Combine subject + body for richer text
+        text = chunk['subject'].fillna('') + ' ' + chunk['body'].fillna('')
+        chunk = chunk.assign(text_clean=preprocess_batch(text))
+
+        # Remove empty
+        chunk = chunk[chunk['text_clean'].str.len() > 10].dropna(subset=LABEL_COLUMNS)
+        yield chunk[['text_clean', *LABEL_COLUMNS]]
+
+def load_dataset(path=DATASET, use_cache=True):
+    """Cleaned English rows plus the language breakdown, cached on disk."""
+    cache_path = os.path.join(CACHE_DIR, f'tickets-{dataset_key(path)}.pkl')
+    if use_cache and os.path.exists(cache_path):
+        print(f"Using cached preprocessed dataset {cache_path}")
+        return joblib.load(cache_path)
 
-def train():
     print("Loading dataset...")
-    df = pd.read_csv('data/tickets.csv')
-    print(f"Total rows: {len(df)}")
+    languages = Counter()
+    df_en = pd.concat(iter_chunks(path, languages=languages), ignore_index=True)
+    df_en[LABEL_COLUMNS] = df_en[LABEL_COLUMNS].astype('category')
+    print(f"Total rows: {sum(languages.values())}")
+    print(f"English rows used: {len(df_en)}")
 
-    # Filter English only for better model performance
-    df_en = df[df['language'] == 'en'].copy()
-    print(f"English rows: {len(df_en)}")
+    dataset = {'frame': df_en, 'languages': dict(languages)}
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        joblib.dump(dataset, cache_path)
+    return dataset
 
-    # Combine subject + body for richer text
-    df_en['text'] = (
-        df_en['subject'].fillna('') + ' ' +
-        df_en['body'].fillna('')
+def fit_head(X_train, y_train, class_weight, fold_jobs):
+    clf = CalibratedClassifierCV(
+        LinearSVC(C=1.0, max_iter=2000, class_weight=class_weight), cv=3, n_jobs=fold_jobs
     )
-    df_en['text_clean'] = df_en['text'].apply(preprocess)
+    return clf.fit(X_train, y_train)
+
+def train(version=None, activate=True, jobs=-1, use_cache=True):
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+    out_dir = os.path.join('models', version)
+    print(f"Training model version {version}")
+    timings = {}
 
-    # Remove empty
-    df_en = df_en[df_en['text_clean'].str.len() > 10]
-    df_en = df_en.dropna(subset=['type', 'priority', 'queue'])
+    with stage('load + preprocess', timings):
+        dataset = load_dataset(use_cache=use_cache)
+    df_en = dataset['frame']
 
     print(f"\nClass distribution - Type:\n{df_en['type'].value_counts()}")
     print(f"\nClass distribution - Priority:\n{df_en['priority'].value_counts()}")
     print(f"\nClass distribution - Queue:\n{df_en['queue'].value_counts()}")
 
-    os.makedirs('models', exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
 
-    # ---- CATEGORY MODEL (type) ----
-    print("\nTraining Category (type) model...")
-    X_cat = df_en['text_clean']
-    y_cat = df_en['type']
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_cat, y_cat, test_size=0.2, random_state=42, stratify=y_cat
+    # One split for every head so the shared vocabulary never sees test rows
+    train_df, test_df = train_test_split(
+        df_en, test_size=0.2, random_state=42, stratify=df_en['type']
     )
 
-    cat_pipeline = Pipeline([
-        ('tfidf', TfidfVectorizer(
+    # ---- SHARED TF-IDF ----
+    print("\nFitting shared TF-IDF vectorizer...")
+    with stage('vectorize', timings):
+        vectorizer = TfidfVectorizer(
             ngram_range=(1, 3),
             max_features=50000,
             sublinear_tf=True,
             min_df=2
-        )),
-        ('clf', CalibratedClassifierCV(LinearSVC(C=1.0, max_iter=2000), cv=3))
-    ])
-    cat_pipeline.fit(X_train, y_train)
-    y_pred = cat_pipeline.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    print(f"Category Model Accuracy: {acc:.4f}")
-    print(classification_report(y_test, y_pred))
-    joblib.dump(cat_pipeline, 'models/category_model.pkl')
-
-    # ---- PRIORITY MODEL ----
-    print("\nTraining Priority model...")
-    X_pri = df_en['text_clean']
-    y_pri = df_en['priority']
-
-    X_train2, X_test2, y_train2, y_test2 = train_test_split(
-        X_pri, y_pri, test_size=0.2, random_state=42, stratify=y_pri
-    )
+        )
+        X_train = vectorizer.fit_transform(train_df['text_clean'])
+        X_test  = vectorizer.transform(test_df['text_clean'])
+    print(f"Vocabulary size: {len(vectorizer.vocabulary_)}")
 
-    pri_pipeline = Pipeline([
-        ('tfidf', TfidfVectorizer(
-            ngram_range=(1, 3),
-            max_features=50000,
-            sublinear_tf=True,
-            min_df=2
-        )),
-        ('clf', CalibratedClassifierCV(
-            LinearSVC(C=1.0, max_iter=2000, class_weight='balanced'), cv=3
-        ))
-    ])
-    pri_pipeline.fit(X_train2, y_train2)
-    y_pred2 = pri_pipeline.predict(X_test2)
-    acc2 = accuracy_score(y_test2, y_pred2)
-    print(f"Priority Model Accuracy: {acc2:.4f}")
-    print(classification_report(y_test2, y_pred2))
-    joblib.dump(pri_pipeline, 'models/priority_model.pkl')
-
-    # ---- QUEUE MODEL ----
-    print("\nTraining Queue model...")
-    X_q = df_en['text_clean']
-    y_q = df_en['queue']
-
-    X_train3, X_test3, y_train3, y_test3 = train_test_split(
-        X_q, y_q, test_size=0.2, random_state=42, stratify=y_q
-    )
+    # Heads train in separate processes; each also splits its calibration
+    # folds across the cores left over
+    workers = os.cpu_count() if jobs in (None, -1) else max(jobs, 1)
+    head_jobs = min(len(HEAD_LABELS), workers)
+    fold_jobs = max(workers // head_jobs, 1)
+    print(f"\nTraining {len(HEAD_LABELS)} heads ({head_jobs} parallel, {fold_jobs} fold jobs each)...")
+    with stage('train heads', timings):
+        fitted = Parallel(n_jobs=head_jobs)(
+            delayed(fit_head)(X_train, train_df[label], class_weight, fold_jobs)
+            for label, class_weight in HEAD_LABELS.values()
+        )
 
-    q_pipeline = Pipeline([
-        ('tfidf', TfidfVectorizer(
-            ngram_range=(1, 3),
-            max_features=50000,
-            sublinear_tf=True,
-            min_df=2
-        )),
-        ('clf', CalibratedClassifierCV(
-            LinearSVC(C=1.0, max_iter=2000, class_weight='balanced'), cv=3
-        ))
-    ])
-    q_pipeline.fit(X_train3, y_train3)
-    y_pred3 = q_pipeline.predict(X_test3)
-    acc3 = accuracy_score(y_test3, y_pred3)
-    print(f"Queue Model Accuracy: {acc3:.4f}")
-    print(classification_report(y_test3, y_pred3))
-    joblib.dump(q_pipeline, 'models/queue_model.pkl')
-
-    # Save stats for the dashboard
+    heads = {}
+    accuracies = {}
+    for (head, (label, _)), clf in zip(HEAD_LABELS.items(), fitted):
+        y_pred = clf.predict(X_test)
+        accuracies[head] = accuracy_score(test_df[label], y_pred)
+        print(f"{head.title()} Model Accuracy: {accuracies[head]:.4f}")
+        print(classification_report(test_df[label], y_pred))
+        heads[head] = clf
+
+    model = MultiHeadClassifier(vectorizer, heads)
+
+    # ---- COMPILED ENGINE ----
+    print("\nExporting compiled linear engine...")
+    with stage('save + export', timings):
+        joblib.dump(model, os.path.join(out_dir, 'ticket_model.pkl'))
+        export_engine(model, os.path.join(out_dir, 'compiled'))
+        engine = LinearEngine.load(os.path.join(out_dir, 'compiled'))
+        engine.check_scoring(test_df['text_clean'])
+        sk_probs  = model.predict_proba(test_df['text_clean'])
+        eng_probs = engine.predict_proba(test_df['text_clean'])
+        max_diff = max(np.abs(sk_probs[h] - eng_probs[h]).max() for h in heads)
+    print(f"Max |sklearn - compiled| probability difference: {max_diff:.2e}")
+
+    # Hashing SGD heads kept next to the calibrated ones; online_learning.py
+    # updates them from admin corrections
+    print("\nFitting online-learning heads...")
+    with stage('online heads', timings):
+        fit_state(train_df['text_clean'],
+                  {head: train_df[label] for head, (label, _) in HEAD_LABELS.items()},
+                  {head: clf.classes_ for head, clf in heads.items()},
+                  {head: weight for head, (_, weight) in HEAD_LABELS.items()}).save(out_dir)
+
+    label_counts = {label: df_en[label].value_counts().to_dict() for label in LABEL_COLUMNS}
+    return finish(version, out_dir, len(df_en), accuracies, label_counts,
+                  dataset['languages'], timings, activate)
+
+def finish(version, out_dir, total, accuracies, label_counts, languages, timings, activate):
+    """Write stats.json for the dashboard and optionally make the version active."""
     stats = {
-        'total_training': len(df_en),
-        'category_accuracy': round(acc * 100, 1),
-        'priority_accuracy': round(acc2 * 100, 1),
-        'queue_accuracy': round(acc3 * 100, 1),
-        'categories': df_en['type'].value_counts().to_dict(),
-        'priorities': df_en['priority'].value_counts().to_dict(),
-        'queues': df_en['queue'].value_counts().to_dict(),
-        'languages': df['language'].value_counts().to_dict(),
+        'version': version,
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'total_training': total,
+        'category_accuracy': round(accuracies['category'] * 100, 1),
+        'priority_accuracy': round(accuracies['priority'] * 100, 1),
+        'queue_accuracy': round(accuracies['queue'] * 100, 1),
+        'categories': label_counts['type'],
+        'priorities': label_counts['priority'],
+        'queues': label_counts['queue'],
+        'languages': languages,
+        'timings_seconds': timings,
     }
-    with open('models/stats.json', 'w') as f:
+    with open(os.path.join(out_dir, 'stats.json'), 'w') as f:
         json.dump(stats, f, indent=2)
 
-    print("\n✅ All models trained and saved!")
+    print(f"\n✅ All models trained and saved to {out_dir} "
+          f"({sum(timings.values()):.1f}s)")
+    if activate:
+        # Validates the new version, then moves models/CURRENT; running
+        # servers pick it up without a restart
+        registry = ModelRegistry('models')
+        registry.activate(version)
+        registry.set_active_version(version)
+        print(f"✅ Version {version} is now active")
     return stats
 
+# ---- OUT-OF-CORE TRAINING ----
+def is_holdout(texts, percent=20):
+    """Stable ~percent% test split by text hash, identical on every pass."""
+    return np.fromiter((zlib.crc32(t.encode()) % 100 < percent for t in texts),
+                       dtype=bool, count=len(texts))
+
+def train_streaming(version=None, activate=True, path=DATASET, epochs=3,
+                    n_features=2 ** 20, chunksize=CHUNK_ROWS):
+    """Train on a CSV larger than RAM with hashed features and SGD heads.
+
+    Pass 1 counts document frequencies and labels; each epoch then streams
+    the file again through partial_fit; a final pass scores the holdout.
+    Memory is bounded by one chunk plus the (n_features x classes) weights.
+    """
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+    out_dir = os.path.join('models', version)
+    print(f"Training model version {version} (streaming, {n_features} hashed features)")
+    timings = {}
+    featurizer = HashingFeaturizer(n_features=n_features, ngram_range=(1, 3),
+                                   sublinear_tf=True)
+
+    with stage('pass 1: idf + labels', timings):
+        doc_freq = np.zeros(n_features)
+        n_docs = 0
+        languages = Counter()
+        label_counts = {label: Counter() for label in LABEL_COLUMNS}
+        sample = None          # texts for the sklearn/compiled parity check
+        for chunk in iter_chunks(path, chunksize, languages):
+            for label in LABEL_COLUMNS:
+                label_counts[label].update(chunk[label].astype(str))
+            chunk = chunk[~is_holdout(chunk['text_clean'])]
+            if chunk.empty:
+                continue
+            if sample is None:
+                sample = chunk['text_clean'].iloc[:1000]
+            doc_freq += np.bincount(featurizer.counts(chunk['text_clean']).indices,
+                                    minlength=n_features)
+            n_docs += len(chunk)
+        featurizer.idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1   # smooth_idf
+    total = sum(label_counts['type'].values())
+    print(f"Rows: {sum(languages.values())} total, {total} English, {n_docs} for training")
+    if not n_docs:
+        raise ValueError(f"{path} has no labelled English rows to train on")
+
+    heads = {}
+    for head, (label, class_weight) in HEAD_LABELS.items():
+        counts = label_counts[label]
+        if class_weight == 'balanced':
+            class_weight = {c: total / (len(counts) * n) for c, n in counts.items()}
+        heads[head] = SGDClassifier(loss='log_loss', alpha=1e-6,
+                                    class_weight=class_weight, random_state=42)
+    classes = {label: np.array(sorted(label_counts[label])) for label in LABEL_COLUMNS}
+
+    rng = np.random.default_rng(42)
+    for epoch in range(1, epochs + 1):
+        with stage(f'epoch {epoch}', timings):
+            for chunk in iter_chunks(path, chunksize):
+                chunk = chunk[~is_holdout(chunk['text_clean'])]
+                if chunk.empty:
+                    continue
+                chunk = chunk.iloc[rng.permutation(len(chunk))]
+                X = featurizer.transform(chunk['text_clean'])
+                for head, (label, _) in HEAD_LABELS.items():
+                    heads[head].partial_fit(X, chunk[label].astype(str), classes=classes[label])
+
+    with stage('holdout evaluation', timings):
+        correct = Counter()
+        n_test = 0
+        for chunk in iter_chunks(path, chunksize):
+            chunk = chunk[is_holdout(chunk['text_clean'])]
+            if chunk.empty:
+                continue
+            X = featurizer.transform(chunk['text_clean'])
+            for head, (label, _) in HEAD_LABELS.items():
+                correct[head] += int((heads[head].predict(X) == chunk[label].astype(str)).sum())
+            n_test += len(chunk)
+    accuracies = {head: correct[head] / n_test if n_test else 0.0 for head in HEAD_LABELS}
+    for head, acc in accuracies.items():
+        print(f"{head.title()} Model Accuracy: {acc:.4f} ({n_test} holdout rows)")
+
+    print("\nExporting compiled linear engine...")
+    with stage('export', timings):
+        os.makedirs(out_dir, exist_ok=True)
+        export_linear(featurizer, heads, os.path.join(out_dir, 'compiled'))
+        engine = LinearEngine.load(os.path.join(out_dir, 'compiled'))
+        engine.check_scoring(sample)
+        X = featurizer.transform(sample)
+        eng_probs = engine.predict_proba(sample)
+        max_diff = max(np.abs(heads[h].predict_proba(X) - eng_probs[h]).max() for h in heads)
+        # The SGD heads are already partial_fit-capable: they are the online state
+        OnlineState(featurizer, heads).save(out_dir)
+    print(f"Max |sklearn - compiled| probability difference: {max_diff:.2e}")
+
+    label_counts = {label: dict(counts) for label, counts in label_counts.items()}
+    return finish(version, out_dir, total, accuracies, label_counts,
+                  dict(languages), timings, activate)
+
 if __name__ == '__main__':
-    train()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--version', help='version name (default: timestamp)')
+    parser.add_argument('--no-activate', action='store_true',
+                        help='train and save without repointing models/CURRENT')
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help='parallel training processes (default: all cores)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-read and re-clean the dataset instead of using data/.cache')
+    parser.add_argument('--streaming', action='store_true',
+                        help='out-of-core training for datasets larger than RAM')
+    parser.add_argument('--dataset', default=DATASET, help='CSV for --streaming')
+    parser.add_argument('--epochs', type=int, default=3, help='passes for --streaming')
+    parser.add_argument('--hash-bits', type=int, default=20,
+                        help='--streaming feature space is 2**bits columns')
+    args = parser.parse_args()
+    if args.streaming:
+        train_streaming(version=args.version, activate=not args.no_activate,
+                        path=args.dataset, epochs=args.epochs,
+                        n_features=2 ** args.hash_bits)
+    else:
+        train(version=args.version, activate=not args.no_activate,
+              jobs=args.jobs, use_cache=not args.no_cache)